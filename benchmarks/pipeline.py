@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+# מדידת ביצועים של הנתיב החם על מחזורים סינתטיים בכמה גדלים:
+# זמן (perf_counter) ושיא הקצאות (tracemalloc) לכל שלב, עם השוואה לקובץ בסיס.
+#   python -m benchmarks.pipeline --sizes 1000x100,10000x1000 --json bench.json
+#   python -m benchmarks.pipeline --compare bench.json > bench_output.txt
+import argparse
+import json
+import sys
+import tempfile
+import tracemalloc
+from pathlib import Path
+from typing import List, Tuple
+
+from placement.diagnostics import Diagnostics, stage
+from placement.ingest import STUDENT_FIELDS, SITE_FIELDS, read_any, resolve_students, resolve_sites, share_categories
+from placement.matching import greedy_match
+from placement.reports import ALL_TEACHERS, build_reports, df_to_xlsx_bytes
+from placement.scoring import Weights
+from placement.synth import make_cohort, write_cohort
+
+DEFAULT_SIZES = "100x10,1000x100,10000x1000"
+FULL_SIZES = "100x10,1000x100,10000x1000,100000x10000"
+MIN_SECONDS = 0.2    # מתחת לזה הרעש גדול מהשינוי – לא נחשב נסיגה בזמן
+MIN_PEAK_MB = 1.0
+
+def parse_sizes(text: str) -> List[Tuple[int, int]]:
+    sizes = []
+    for part in text.split(","):
+        n, _, m = part.strip().lower().partition("x")
+        sizes.append((int(n), int(m)))
+    return sizes
+
+def bench_size(n: int, m: int, seed: int, fmt: str, workdir: Path) -> list:
+    # השלבים של הספרייה נמדדים דרך placement.diagnostics (כולל שלבים מקוננים, למשל greedy_match/score);
+    # כאן נוספים רק השלבים שמחוץ לספרייה
+    size = f"{n}x{m}"
+    diag = Diagnostics(run_id=size, trace_memory=True, max_records=10_000)
+    with diag.activate():
+        with stage("generate") as rec:
+            students_raw, sites_raw = make_cohort(n, m, seed)
+            rec.rows = n + m
+        with stage(f"write_{fmt}", n + m):
+            paths = write_cohort(students_raw, sites_raw, workdir / size, fmt)
+        del students_raw, sites_raw
+        with stage("students"):
+            students = resolve_students(read_any(paths[0], STUDENT_FIELDS))
+        with stage("sites"):
+            sites = resolve_sites(read_any(paths[1], SITE_FIELDS))
+        students, sites = share_categories(students, sites)
+        result_df = greedy_match(students, sites, Weights())
+        reports = build_reports(result_df, sites)
+        with stage("teacher_slices", len(result_df)) as rec:
+            rec.rows = sum(len(reports.teacher(t)) for t in [ALL_TEACHERS] + reports.teacher_names)
+        df_to_xlsx_bytes(reports.results)
+    return [{"size": size, "stage": r.stage, "seconds": round(r.seconds, 4), "peak_mb": r.peak_mb,
+             "rows": r.rows if r.rows is not None else r.rows_in} for r in diag.records]
+
+def format_table(records: list) -> str:
+    lines = [f"{'size':>14}  {'stage':<40} {'seconds':>9} {'peak MB':>9} {'rows':>9}"]
+    for r in records:
+        rows = "" if r["rows"] is None else r["rows"]
+        lines.append(f"{r['size']:>14}  {r['stage']:<40} {r['seconds']:>9.3f} {r['peak_mb']:>9.1f} {rows:>9}")
+    return "\n".join(lines)
+
+def compare(records: list, baseline: list, max_slowdown: float) -> List[str]:
+    # נסיגה: זמן או שיא זיכרון גדולים פי max_slowdown מהבסיס (מעל סף רעש מינימלי)
+    # שלב שנקרא כמה פעמים (למשל share_categories בתוך encode) מושווה לפי מספר ההופעה
+    def keyed(recs: list) -> dict:
+        seen: dict = {}
+        out = {}
+        for r in recs:
+            k = (r["size"], r["stage"])
+            seen[k] = seen.get(k, 0) + 1
+            out[k + (seen[k],)] = r
+        return out
+
+    base = keyed(baseline)
+    problems = []
+    for key, r in keyed(records).items():
+        b = base.get(key)
+        if b is None:
+            continue
+        if r["seconds"] > max(b["seconds"] * max_slowdown, MIN_SECONDS):
+            problems.append(f"{r['size']} {r['stage']}: {b['seconds']:.3f}s -> {r['seconds']:.3f}s")
+        if r["peak_mb"] > max(b["peak_mb"] * max_slowdown, MIN_PEAK_MB):
+            problems.append(f"{r['size']} {r['stage']}: {b['peak_mb']:.1f}MB -> {r['peak_mb']:.1f}MB")
+    return problems
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks.pipeline", description="מדידת זמן וזיכרון לכל שלב בשיבוץ")
+    p.add_argument("--sizes", default=DEFAULT_SIZES, help=f"סטודנטים x אתרים, מופרדים בפסיק (ברירת מחדל: {DEFAULT_SIZES})")
+    p.add_argument("--full", action="store_true", help=f"כל הגדלים עד 100k סטודנטים: {FULL_SIZES}")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--format", choices=["csv", "xlsx"], default="csv", help="פורמט הקבצים שנקראים ב-read_any")
+    p.add_argument("--json", type=Path, metavar="PATH", help="שמירת התוצאות כ-JSON (לשימוש כבסיס ב---compare)")
+    p.add_argument("--compare", type=Path, metavar="BASELINE", help="השוואה לקובץ JSON קודם; יציאה עם 1 בנסיגה")
+    p.add_argument("--max-slowdown", type=float, default=1.5, help="יחס מותר מול הבסיס (ברירת מחדל: 1.5)")
+    args = p.parse_args(argv)
+
+    records: list = []
+    tracemalloc.start()   # פעיל לאורך כל המדידה, ולא נפתח ונסגר בכל שלב
+    try:
+        with tempfile.TemporaryDirectory(prefix="placement-bench-") as tmp:
+            bench_size(50, 5, args.seed, args.format, Path(tmp))   # חימום: ייבוא מודולים ומטמונים חד-פעמיים
+            for n, m in parse_sizes(FULL_SIZES if args.full else args.sizes):
+                records += bench_size(n, m, args.seed, args.format, Path(tmp))
+    finally:
+        tracemalloc.stop()
+    print(format_table(records))
+    if args.json:
+        args.json.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding="utf-8")
+    if args.compare:
+        problems = compare(records, json.loads(args.compare.read_text(encoding="utf-8")), args.max_slowdown)
+        for line in problems:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# זמן התגובה של האפליקציה לאינטראקציות: כל rerun של streamlit_app.py נמדד בהרצה בלי דפדפן
+# (streamlit.testing.v1.AppTest) על מחזור סינתטי גדול, ומושווה לתקציב של השלב.
+#   python -m benchmarks.rerun_latency --size 20000x2000
+#   python -m benchmarks.rerun_latency --budget teacher=0.5 --json latency.json
+# יציאה עם 1 כשיש rerun מעל התקציב או חריגה באפליקציה.
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from unittest import mock
+
+APP_PATH = Path(__file__).resolve().parents[1] / "streamlit_app.py"
+DEFAULT_SIZE = "20000x2000"
+# שניות ל-rerun אחד (הגרוע מבין החזרות). match_wait הוא זמן השיבוץ ברקע – נמדד ולא נבדק
+DEFAULT_BUDGETS = {
+    "load": 3.0,              # פתיחת הדף בלי קבצים
+    "upload_students": 25.0,  # קריאה + זיהוי של קובץ הסטודנטים; ב-XLSX רוב הזמן הוא openpyxl
+    "upload_sites": 5.0,
+    "match_click": 2.0,       # הכפתור רק שולח עבודת רקע
+    "match_finish": 10.0,     # שמירת הריצה, בניית הדוחות והצגת התוצאות
+    "explain": 1.5,           # number_input של הסבר הציון
+    "teacher": 1.5,           # selectbox של דוח המורים
+    "rerun": 1.5,             # rerun בלי שינוי
+}
+EXPLAIN_LABEL = "בחר/י שורה להסבר"
+TEACHER_LABEL = "סינון לפי מורה"
+MATCH_LABEL = "בצע שיבוץ"
+QUIET_LOGGERS = ("streamlit.deprecation_util", "streamlit.runtime.scriptrunner_utils.script_run_context")
+
+def parse_size(text: str):
+    n, _, m = text.strip().lower().partition("x")
+    return int(n), int(m)
+
+def parse_budgets(items: List[str]) -> Dict[str, float]:
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in items:
+        step, _, seconds = item.partition("=")
+        if step not in budgets:
+            raise SystemExit(f"unknown step {step!r}; one of: {', '.join(budgets)}")
+        budgets[step] = float(seconds)
+    return budgets
+
+# ----- העלאת קבצים -----
+# ב-AppTest אין file_uploader אמיתי: הווידג'ט נרשם כרגיל, ובמקום הקובץ של הדפדפן חוזר קובץ מהדיסק
+class FakeUpload(io.BytesIO):
+    def __init__(self, path: Path, file_id: str):
+        super().__init__(path.read_bytes())
+        self.name = path.name
+        self.file_id = file_id
+
+class Uploads:
+    def __init__(self):
+        self.files: Dict[str, FakeUpload] = {}
+
+    def patch(self):
+        import streamlit as st
+        original = st.file_uploader
+
+        def file_uploader(label, *args, key=None, **kwargs):
+            original(label, *args, key=key, **kwargs)
+            return self.files.get(key)
+        return mock.patch.object(st, "file_uploader", file_uploader)
+
+# ----- מדידה -----
+class Timer:
+    def __init__(self, at, budgets: Dict[str, float]):
+        self.at = at
+        self.budgets = budgets
+        self.records: list = []
+
+    def rerun(self, step: str, action=None) -> float:
+        # action: אינטראקציה עם ווידג'ט (click/set_value) לפני ה-rerun
+        t0 = time.perf_counter()
+        (action() if action is not None else self.at).run()
+        seconds = time.perf_counter() - t0
+        errors = [str(e.value)[:200] for e in self.at.exception]
+        self.records.append({"step": step, "seconds": round(seconds, 3), "budget": self.budgets.get(step),
+                             "errors": errors, "stages": self._slowest_stages(t0)})
+        return seconds
+
+    def _slowest_stages(self, since: float, top: int = 3) -> list:
+        # השלבים של placement.diagnostics שנמדדו ב-rerun הזה, לפי זמן
+        diag = self.at.session_state["diagnostics"] if "diagnostics" in self.at.session_state else None
+        if diag is None:
+            return []
+        wall0 = time.time() - (time.perf_counter() - since)
+        recs = [r for r in diag.records if r.started >= wall0 and "/" not in r.stage]
+        return [f"{r.stage} {r.seconds:.2f}s" for r in sorted(recs, key=lambda r: -r.seconds)[:top]]
+
+    def widget(self, kind: str, label: str):
+        found = [w for w in getattr(self.at, kind) if label in w.label]
+        if not found:
+            raise SystemExit(f"no {kind} labelled {label!r} in the app")
+        return found[0]
+
+def run_session(n: int, m: int, seed: int, fmt: str, repeats: int, budgets: Dict[str, float],
+                workdir: Path, timeout: float) -> list:
+    from streamlit.testing.v1 import AppTest
+    from placement.synth import make_cohort, write_cohort
+
+    students_path, sites_path = write_cohort(*make_cohort(n, m, seed), workdir / "cohort", fmt)
+    # AppTest מחזיר את רמת הלוג של streamlit ל-INFO בכל run; אזהרות שחוזרות בכל rerun מושתקות כך
+    for name in QUIET_LOGGERS:
+        logging.getLogger(name).disabled = True
+    uploads = Uploads()
+    at = AppTest.from_file(str(APP_PATH), default_timeout=timeout)
+    timer = Timer(at, budgets)
+    with uploads.patch():
+        timer.rerun("load")
+        uploads.files["students_file"] = FakeUpload(students_path, "students-1")
+        timer.rerun("upload_students")
+        uploads.files["sites_file"] = FakeUpload(sites_path, "sites-1")
+        timer.rerun("upload_sites")
+
+        timer.rerun("match_click", timer.widget("button", MATCH_LABEL).click)
+        # השיבוץ רץ ב-thread ברקע; בדפדפן ה-fragment של ההתקדמות מתרענן לבד, כאן – rerun עד שהעבודה נגמרת
+        t0 = time.perf_counter()
+        while "match_job" in at.session_state and at.session_state["match_job"].running:
+            time.sleep(0.05)
+        timer.records.append({"step": "match_wait", "seconds": round(time.perf_counter() - t0, 3), "budget": None,
+                              "errors": [], "stages": []})
+        timer.rerun("match_finish")
+        if "match_job" in at.session_state:   # ה-rerun שסוגר את העבודה קורא ל-st.rerun()
+            timer.rerun("match_finish")
+
+        # AppTest מריץ את כל הסקריפט גם כשהווידג'ט בתוך fragment – הזמן הוא חסם עליון לדפדפן
+        for i in range(1, repeats + 1):
+            explain = timer.widget("number_input", EXPLAIN_LABEL)
+            timer.rerun("explain", lambda: explain.set_value(min(i * 7, n - 1)))
+        for i in range(1, repeats + 1):
+            teacher = timer.widget("selectbox", TEACHER_LABEL)
+            options = teacher.options
+            timer.rerun("teacher", lambda: teacher.set_value(options[i % len(options)]))
+        for _ in range(repeats):
+            timer.rerun("rerun")
+    return timer.records
+
+def check(records: list) -> List[str]:
+    problems = []
+    for r in records:
+        if r["errors"]:
+            problems.append(f"{r['step']}: exception in app: {r['errors'][0]}")
+        if r["budget"] is not None and r["seconds"] > r["budget"]:
+            slowest = f" ({', '.join(r['stages'])})" if r["stages"] else ""
+            problems.append(f"{r['step']}: {r['seconds']:.3f}s > budget {r['budget']:.3f}s{slowest}")
+    return problems
+
+def format_table(records: list) -> str:
+    lines = [f"{'step':<16} {'runs':>5} {'median':>9} {'worst':>9} {'budget':>9}"]
+    steps: Dict[str, list] = {}
+    for r in records:
+        steps.setdefault(r["step"], []).append(r)
+    for step, recs in steps.items():
+        secs = sorted(r["seconds"] for r in recs)
+        budget = recs[0]["budget"]
+        lines.append(f"{step:<16} {len(secs):>5} {secs[len(secs) // 2]:>9.3f} {secs[-1]:>9.3f} "
+                     f"{'-' if budget is None else f'{budget:.3f}':>9}")
+    return "\n".join(lines)
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks.rerun_latency",
+                                description="זמן rerun של האפליקציה לכל אינטראקציה, מול תקציב")
+    p.add_argument("--size", default=DEFAULT_SIZE, help=f"סטודנטים x אתרים (ברירת מחדל: {DEFAULT_SIZE})")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--format", choices=["csv", "xlsx"], default="xlsx", help="פורמט הקבצים שמועלים")
+    p.add_argument("--repeats", type=int, default=3, help="חזרות לכל אינטראקציה (ברירת מחדל: 3)")
+    p.add_argument("--budget", action="append", default=[], metavar="STEP=SECONDS",
+                   help="תקציב לשלב (אפשר כמה פעמים); שלבים: " + ", ".join(DEFAULT_BUDGETS))
+    p.add_argument("--scale", type=float, default=1.0, help="הכפלת כל התקציבים (למכונה איטית)")
+    p.add_argument("--timeout", type=float, default=300.0, help="זמן מקסימלי ל-rerun אחד ב-AppTest")
+    p.add_argument("--json", type=Path, metavar="PATH", help="שמירת הזמנים כ-JSON")
+    args = p.parse_args(argv)
+
+    budgets = {k: v * args.scale for k, v in parse_budgets(args.budget).items()}
+    n, m = parse_size(args.size)
+    with tempfile.TemporaryDirectory(prefix="placement-latency-") as tmp:
+        # הריצות השמורות והקבצים הנשפכים – בתיקייה זמנית, לא במאגר של המשתמש.
+        # placement קורא את המשתנים בייבוא, ולכן הוא מיובא רק מכאן
+        with mock.patch.dict(os.environ, {"PLACEMENT_RUNS_DIR": str(Path(tmp) / "runs"),
+                                          "PLACEMENT_SPILL_DIR": str(Path(tmp) / "spill")}):
+            from placement.diagnostics import enable_json_log
+            enable_json_log(io.StringIO())   # האפליקציה מוצאת handler קיים ולא כותבת שורת JSON לכל שלב
+            records = run_session(n, m, args.seed, args.format, args.repeats, budgets, Path(tmp), args.timeout)
+    print(format_table(records))
+    if args.json:
+        args.json.write_text(json.dumps(records, ensure_ascii=False, indent=1), encoding="utf-8")
+    problems = check(records)
+    for line in problems:
+        print(f"OVER BUDGET {line}", file=sys.stderr)
+    return 1 if problems else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
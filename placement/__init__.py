@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# ליבת השיבוץ – ללא Streamlit, לשימוש מהאפליקציה, משורת הפקודה ומעבודות אצווה
+from .ingest import (STU_COLS, SITE_COLS, STUDENT_FIELDS, SITE_FIELDS, pick_col, select_columns,
+                     read_any, read_csv_chunks, normalize_text, normalize_series, resolve_students, resolve_sites,
+                     share_categories)
+from .scoring import (Weights, compute_score, compute_score_with_explain, split_prefs, field_match,
+                      FieldIndex, build_field_index, field_hits,
+                      ScoreMatrix, ScoreEncoding, encode_scoring, score_components, build_score_matrix,
+                      SCORE_MEMORY_BYTES, SPARSE_MIN_CELLS, score_dtype, block_rows, type_score_table,
+                      LazyScoreRows, ScoreCandidates, score_candidates, top_k_sites)
+from .matching import (SUPERVISOR_CAP, UNMATCHED, SITE_IDX_COL, PART_COLS, PROGRESS_EVERY, MatchCancelled,
+                       SITE_RANK_KEYS, DEFAULT_SITE_RANK, MATCHERS, ASSIGNERS, greedy_assign, assignments_to_df, score_breakdown,
+                       greedy_chosen, optimal_chosen, stable_chosen, greedy_match, optimal_match, stable_match)
+from .diagnostics import (TRACE_MEMORY, StageRecord, Diagnostics, stage, instrumented, current_diagnostics,
+                          set_diagnostics, enable_json_log)
+from .incremental import CohortDiff, RematchResult, MOVE_COLS, rematch
+from .runs import RUNS_DIR, RunMeta, RunSnapshot, RunStore, RunDiff, new_run_id, diff_runs
+from .reports import (ALL_TEACHERS, TEACHER_COLS, DEFAULT_ALTERNATIVES, RunReports, build_reports, alternatives_table,
+                      write_xlsx, workbook_bytes, df_to_xlsx_bytes, report_sheets,
+                      results_table, summary_table, capacity_table, teacher_names, teacher_table)
+from .store import (SPILL_DIR, SESSION_BUDGET_BYTES, compact_frame, frame_nbytes, SpilledFrame, spill_frame, arrow_to_pandas,
+                    purge_spills, FrameStore)
+from .sweep import SWEEP_WORKERS, weight_grid, sweep_table, run_sweep
+from .jobs import JOB_WORKERS, MatchJob, submit_match, submit_sweep
+from .batch import (BATCH_WORKERS, Department, DepartmentResult, departments_in_dir, read_manifest, load_departments,
+                    run_department, combined_summary, run_batch)
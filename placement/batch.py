@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# עיבוד אצווה של כמה מחלקות/מחזורים: לכל זוג קבצים (סטודנטים + אתרים) – קריאה, זיהוי, שיבוץ ודוחות
+# בתהליך נפרד. התוצאות נכתבות בזרימה לחוברת אחת, לפי סדר המחלקות: גיליון סיכום כללי בראש החוברת,
+# ולכל מחלקה גיליון תוצאות וגיליון סיכום. מחלקה שנכשלה נרשמת בסיכום ולא עוצרת את השאר.
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import Diagnostics, enable_json_log
+from .ingest import STUDENT_FIELDS, SITE_FIELDS, read_any, resolve_students, resolve_sites, share_categories
+from .matching import MATCHERS, UNMATCHED, ProgressFn
+from .reports import build_reports, write_xlsx
+from .scoring import Weights
+from .store import compact_frame
+
+BATCH_WORKERS = int(os.environ.get("PLACEMENT_BATCH_WORKERS", str(os.cpu_count() or 1)))
+DATA_SUFFIXES = (".csv", ".xlsx", ".xls")
+# זיהוי הקבצים בתיקיית מחלקה לפי השם
+STUDENT_HINTS = ("student", "סטודנט")
+SITE_HINTS = ("site", "אתר", "מדריכ")
+MANIFEST_COLS = ("department", "students", "sites")   # ועמודת mode אופציונלית
+COMBINED_SHEET = "סיכום כללי"
+COMBINED_COLS = ["מחלקה", "סטודנטים", "שובצו", "לא שובצו", "אחוז התאמה ממוצע", "אתרים", "קיבולת",
+                 "מקומות פנויים", "שניות", "שגיאה"]
+
+@dataclass
+class Department:
+    name: str
+    students: Path
+    sites: Path
+    mode: str = "greedy"
+
+@dataclass
+class DepartmentResult:
+    name: str
+    results: Optional[pd.DataFrame] = None   # טבלת התוצאות (results_table)
+    summary: Optional[pd.DataFrame] = None   # סיכום לפי מקום הכשרה
+    stats: dict = field(default_factory=dict)
+    error: str = ""
+    seconds: float = 0.0
+
+# ====== רשימת המחלקות ======
+def _kind(path: Path) -> Optional[str]:
+    stem = path.stem.lower()
+    if any(h in stem for h in STUDENT_HINTS):
+        return "students"
+    if any(h in stem for h in SITE_HINTS):
+        return "sites"
+    return None
+
+def departments_in_dir(root: Path, mode: str = "greedy") -> List[Department]:
+    # כל תת-תיקייה היא מחלקה (שם התיקייה = שם המחלקה), ובה קובץ סטודנטים אחד וקובץ אתרים אחד
+    depts = []
+    for sub in sorted(p for p in Path(root).iterdir() if p.is_dir() and not p.name.startswith(".")):
+        found = {"students": [], "sites": []}
+        for f in sorted(sub.iterdir()):
+            if f.is_file() and f.suffix.lower() in DATA_SUFFIXES and not f.name.startswith(("~$", ".")):
+                kind = _kind(f)
+                if kind:
+                    found[kind].append(f)
+        if not found["students"] and not found["sites"]:
+            continue
+        if len(found["students"]) != 1 or len(found["sites"]) != 1:
+            raise ValueError(f"בתיקייה {sub} צריך קובץ סטודנטים אחד וקובץ אתרים אחד "
+                             f"(נמצאו {len(found['students'])} ו-{len(found['sites'])})")
+        depts.append(Department(sub.name, found["students"][0], found["sites"][0], mode))
+    return depts
+
+def read_manifest(path: Path, mode: str = "greedy") -> List[Department]:
+    # CSV עם כותרת department,students,sites[,mode]; נתיבים יחסיים – ביחס לתיקיית הקובץ
+    path = Path(path)
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        missing = [c for c in MANIFEST_COLS if c not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"בקובץ {path} חסרות העמודות: {', '.join(missing)}")
+        return [Department(row["department"].strip(), path.parent / row["students"].strip(),
+                           path.parent / row["sites"].strip(), (row.get("mode") or "").strip() or mode)
+                for row in reader if (row.get("department") or "").strip()]
+
+def load_departments(source: Path, mode: str = "greedy") -> List[Department]:
+    source = Path(source)
+    depts = departments_in_dir(source, mode) if source.is_dir() else read_manifest(source, mode)
+    if not depts:
+        raise ValueError(f"לא נמצאו מחלקות ב-{source}")
+    names = [d.name for d in depts]
+    dup = sorted({n for n in names if names.count(n) > 1})
+    if dup:
+        raise ValueError(f"שמות מחלקות כפולים: {', '.join(dup)}")
+    bad = sorted({d.mode for d in depts} - set(MATCHERS))
+    if bad:
+        raise ValueError(f"שיטת שיבוץ לא מוכרת: {', '.join(bad)}")
+    return depts
+
+# ====== מחלקה אחת (רץ בתהליך העובד) ======
+def run_department(dept: Department, diagnostics: bool = False) -> DepartmentResult:
+    out = DepartmentResult(dept.name)
+    t0 = time.perf_counter()
+    try:
+        if diagnostics:
+            enable_json_log()
+        with Diagnostics(run_id=dept.name, trace_memory=True).activate() if diagnostics else nullcontext():
+            students = resolve_students(read_any(dept.students, STUDENT_FIELDS))
+            sites = resolve_sites(read_any(dept.sites, SITE_FIELDS))
+            students, sites = share_categories(students, sites)
+            result_df = MATCHERS[dept.mode](students, sites, Weights())
+            reports = build_reports(result_df, sites)
+        matched = (result_df["שם מקום ההתמחות"] != UNMATCHED).to_numpy()
+        scores = result_df["אחוז התאמה"].to_numpy()[matched]
+        # טיפוסים קומפקטיים – פחות בתים בדרך חזרה לתהליך הראשי
+        out.results, out.summary = compact_frame(reports.results), compact_frame(reports.summary)
+        out.stats = {
+            "students": len(result_df), "matched": int(matched.sum()), "unmatched": int((~matched).sum()),
+            "mean_score": round(float(scores.mean()), 2) if len(scores) else None,
+            "sites": len(sites), "capacity": int(sites["site_capacity"].sum()),
+            "seats_left": int(sites["capacity_left"].clip(lower=0).sum()),
+        }
+    except Exception as e:   # מחלקה אחת שנכשלה (קובץ חסר/פגום) לא עוצרת את האצווה
+        out.error = f"{type(e).__name__}: {e}"
+    out.seconds = round(time.perf_counter() - t0, 2)
+    return out
+
+def _results(depts: Sequence[Department], workers: int, diagnostics: bool) -> Iterator[DepartmentResult]:
+    # לפי סדר המחלקות; כל התוצאות שהגיעו לפני תורן נשמרות עד שנכתבות
+    run = partial(run_department, diagnostics=diagnostics)
+    if workers <= 1:
+        yield from map(run, depts)
+        return
+    # spawn ולא fork – כמו בניתוח הרגישות
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        yield from pool.map(run, depts)
+
+# ====== סיכום כללי ======
+def combined_summary(results: Sequence[DepartmentResult]) -> pd.DataFrame:
+    rows = []
+    for r in results:
+        s = r.stats
+        rows.append([r.name, s.get("students"), s.get("matched"), s.get("unmatched"), s.get("mean_score"),
+                     s.get("sites"), s.get("capacity"), s.get("seats_left"), r.seconds, r.error])
+    df = pd.DataFrame(rows, columns=COMBINED_COLS)
+    ok = df["שגיאה"] == ""
+    if ok.any():
+        # שורת סה"כ; הממוצע משוקלל לפי מספר המשובצים
+        total = {c: df.loc[ok, c].sum() for c in ["סטודנטים", "שובצו", "לא שובצו", "אתרים", "קיבולת", "מקומות פנויים"]}
+        weights = df.loc[ok, "שובצו"].to_numpy(dtype=float)
+        means = df.loc[ok, "אחוז התאמה ממוצע"].fillna(0).to_numpy(dtype=float)
+        total["אחוז התאמה ממוצע"] = round(float(np.average(means, weights=weights)), 2) if weights.sum() else None
+        df.loc[len(df)] = {"מחלקה": "סה\"כ", **total, "שניות": round(float(df["שניות"].sum()), 2), "שגיאה": ""}
+    return df
+
+def run_batch(departments: Sequence[Department], output, workers: Optional[int] = None, diagnostics: bool = False,
+              progress: Optional[ProgressFn] = None) -> pd.DataFrame:
+    # output: נתיב או קובץ פתוח לחוברת; מחזיר את הסיכום הכללי.
+    # גיליונות המחלקה נכתבים ברגע שתורה מגיע ומשוחררים מיד, כך שהתהליך הראשי לא מחזיק את כל האצווה
+    workers = max(1, min(workers or BATCH_WORKERS, len(departments)))
+    done: List[DepartmentResult] = []
+
+    def sheets():
+        for res in _results(departments, workers, diagnostics):
+            res_results, res_summary = res.results, res.summary
+            res.results = res.summary = None
+            done.append(res)
+            if progress is not None:
+                progress(len(done), len(departments))
+            if not res.error:
+                yield res.name, res_results
+                yield f"{res.name[:22]} – סיכום", res_summary
+
+    write_xlsx(sheets(), output, leading=(COMBINED_SHEET, lambda: combined_summary(done)))
+    return combined_summary(done)
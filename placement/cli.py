@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# שורת פקודה: python -m placement students.xlsx sites.xlsx -o out/
+#             python -m placement --batch departments/ -o out/   (כמה מחלקות, חוברת אחת)
+import argparse
+import sys
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Optional
+
+from .batch import BATCH_WORKERS, load_departments, run_batch
+from .diagnostics import Diagnostics, enable_json_log
+from .ingest import STUDENT_FIELDS, SITE_FIELDS, read_any, resolve_students, resolve_sites, share_categories
+from .matching import MATCHERS, UNMATCHED
+from .reports import (DEFAULT_ALTERNATIVES, alternatives_table, df_to_xlsx_bytes, report_sheets, results_table,
+                      summary_table, write_xlsx)
+from .runs import new_run_id
+from .scoring import Weights
+from .sweep import run_sweep, weight_grid
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(prog="python -m placement",
+                                usage="%(prog)s students sites [options]\n"
+                                      "       %(prog)s --batch SOURCE [options]",
+                                description="שיבוץ סטודנטים למקומות התמחות וכתיבת דוחות XLSX")
+    p.add_argument("students", type=Path, nargs="?", help="קובץ סטודנטים (CSV/XLSX)")
+    p.add_argument("sites", type=Path, nargs="?", help="קובץ אתרי התמחות/מדריכים (CSV/XLSX)")
+    p.add_argument("-o", "--out-dir", type=Path, default=Path("."), help="תיקיית פלט (ברירת מחדל: התיקייה הנוכחית)")
+    p.add_argument("--mode", choices=sorted(MATCHERS), default="greedy",
+                   help="שיטת שיבוץ (ברירת מחדל: greedy; באצווה – למחלקות שלא נקבעה להן שיטה)")
+    p.add_argument("--single-workbook", action="store_true",
+                   help="חוברת אחת: תוצאות, סיכום, קיבולות, חלופות וגיליון לכל מורה")
+    p.add_argument("--alternatives", type=int, default=0, metavar="K",
+                   help=f"גם K האתרים הבאים בתור לכל סטודנט/ית (למשל {DEFAULT_ALTERNATIVES}; ברירת מחדל: 0 = בלי)")
+    p.add_argument("--sweep", type=float, metavar="STEP",
+                   help="גם ניתוח רגישות למשקלות ברשת בצעד STEP (למשל 0.1) → weight_sensitivity.xlsx")
+    p.add_argument("--diagnostics", action="store_true",
+                   help="שורת JSON ל-stderr לכל שלב: זמן, שורות ושיא הקצאות (באצווה run_id = שם המחלקה)")
+
+    # ----- אצווה: כמה מחלקות במקביל, לחוברת XLSX אחת -----
+    b = p.add_argument_group("אצווה (--batch)")
+    b.add_argument("--batch", type=Path, metavar="SOURCE",
+                   help="תיקייה עם תת-תיקייה לכל מחלקה, או קובץ CSV עם העמודות department,students,sites[,mode] "
+                        "(במקום students sites)")
+    b.add_argument("--workers", type=int, default=BATCH_WORKERS,
+                   help=f"תהליכים במקביל (ברירת מחדל: PLACEMENT_BATCH_WORKERS או מספר המעבדים – {BATCH_WORKERS})")
+    b.add_argument("--workbook", default="placement_batch.xlsx", help="שם החוברת (ברירת מחדל: placement_batch.xlsx)")
+    return p
+
+def parse_args(argv=None) -> argparse.Namespace:
+    p = build_parser()
+    args = p.parse_args(argv)
+    if args.batch is not None:
+        if args.students is not None:
+            p.error("--batch מחליף את students sites – לא שניהם")
+        if args.single_workbook or args.sweep:
+            p.error("--single-workbook/--sweep לא זמינים עם --batch")
+    elif args.sites is None:
+        p.error("נדרשים students ו-sites (או --batch SOURCE)")
+    return args
+
+def batch_main(args: argparse.Namespace) -> int:
+    try:
+        depts = load_departments(args.batch, args.mode)
+        args.out_dir.mkdir(parents=True, exist_ok=True)
+        path = args.out_dir / args.workbook
+        total = run_batch(depts, str(path), args.workers, args.diagnostics,
+                          progress=lambda done, n: print(f"[{done}/{n}] {depts[done - 1].name}", file=sys.stderr))
+    except (OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    failed = total[total["שגיאה"] != ""]
+    for name, err in zip(failed["מחלקה"], failed["שגיאה"]):
+        print(f"error: {name}: {err}", file=sys.stderr)
+    print(f"{len(depts)} departments, {len(failed)} failed -> {path}")
+    return 1 if len(failed) else 0
+
+def run(students_path: Path, sites_path: Path, out_dir: Path, mode: str = "greedy",
+        single_workbook: bool = False, sweep_step: Optional[float] = None,
+        alternatives: int = 0) -> dict:
+    students = resolve_students(read_any(students_path, STUDENT_FIELDS))
+    sites = resolve_sites(read_any(sites_path, SITE_FIELDS))
+    students, sites = share_categories(students, sites)
+    # ניתוח הרגישות לפני השיבוץ – השיבוץ מעדכן את capacity_left של sites
+    sweep_df = run_sweep(students, sites, weight_grid(sweep_step), mode=mode) if sweep_step else None
+    result_df = MATCHERS[mode](students, sites, Weights())
+    alt_df = alternatives_table(students, sites, result_df, Weights(), alternatives) if alternatives > 0 else None
+
+    out_dir.mkdir(parents=True, exist_ok=True)
+    if single_workbook:
+        outputs = ["student_site_reports.xlsx"]
+        write_xlsx(report_sheets(result_df, sites, alt_df), str(out_dir / outputs[0]))
+    else:
+        outputs = {
+            "student_site_matching.xlsx": df_to_xlsx_bytes(results_table(result_df), sheet_name="תוצאות"),
+            "student_site_summary.xlsx": df_to_xlsx_bytes(summary_table(result_df), sheet_name="סיכום"),
+        }
+        if alt_df is not None:
+            outputs["student_site_alternatives.xlsx"] = df_to_xlsx_bytes(alt_df, sheet_name="חלופות")
+        for name, data in outputs.items():
+            (out_dir / name).write_bytes(data)
+    if sweep_df is not None:
+        outputs = list(outputs) + ["weight_sensitivity.xlsx"]
+        write_xlsx({"ניתוח רגישות": sweep_df}, str(out_dir / outputs[-1]))
+    return {
+        "students": len(result_df),
+        "unmatched": int((result_df["שם מקום ההתמחות"] == UNMATCHED).sum()),
+        "files": [str(out_dir / name) for name in outputs],
+    }
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    if args.batch is not None:
+        return batch_main(args)
+    diag = Diagnostics(run_id=new_run_id(), trace_memory=True) if args.diagnostics else None
+    if diag is not None:
+        enable_json_log()
+    try:
+        with diag.activate() if diag is not None else nullcontext():
+            info = run(args.students, args.sites, args.out_dir, args.mode, args.single_workbook, args.sweep,
+                       args.alternatives)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    print(f"{info['students']} students, {info['unmatched']} unmatched -> {', '.join(info['files'])}")
+    return 0
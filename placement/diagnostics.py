@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# אבחון ביצועים: זמן, מספר שורות ושיא הקצאות לכל שלב בצינור (קריאה → זיהוי → שיבוץ → דוחות → XLSX).
+# הפונקציות בספרייה עטופות ב-stage(); כל עוד אין Diagnostics פעיל בהקשר הנוכחי העטיפה לא מודדת כלום.
+# כל שלב שמסתיים נכתב גם כשורת JSON ללוגר placement.diagnostics.
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, asdict
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+# tracemalloc משותף לכל התהליך ומאט כל הקצאה של אובייקטי פייתון (גם של סשנים אחרים בשרת),
+# ולכן כבוי כברירת מחדל: PLACEMENT_TRACE_MEMORY=1, trace_memory=True או המתג בפאנל האבחון
+TRACE_MEMORY = os.environ.get("PLACEMENT_TRACE_MEMORY", "0") == "1"
+MAX_RECORDS = 500
+logger = logging.getLogger("placement.diagnostics")
+
+@dataclass
+class StageRecord:
+    stage: str                       # שלב מקונן: "greedy_match/score"
+    run_id: str = ""
+    started: float = 0.0             # time.time()
+    seconds: float = 0.0
+    peak_mb: Optional[float] = None  # None כשהמדידה כבויה
+    rows_in: Optional[int] = None
+    rows: Optional[int] = None       # שורות שיצאו מהשלב
+    ok: bool = True
+
+class Diagnostics:
+    def __init__(self, run_id: str = "", trace_memory: bool = TRACE_MEMORY, max_records: int = MAX_RECORDS):
+        self.run_id = run_id
+        self.trace_memory = trace_memory
+        self.max_records = max_records
+        self.records: List[StageRecord] = []
+
+    def _add(self, rec: StageRecord) -> None:
+        self.records.append(rec)
+        del self.records[:-self.max_records]
+
+    def for_run(self, run_id: str) -> List[StageRecord]:
+        return [r for r in self.records if r.run_id == run_id]
+
+    def frame(self, run_id: Optional[str] = None) -> pd.DataFrame:
+        recs = self.records if run_id is None else self.for_run(run_id)
+        return pd.DataFrame({
+            "שלב": [r.stage for r in recs],
+            "ריצה": [r.run_id for r in recs],
+            "שניות": [round(r.seconds, 3) for r in recs],
+            "שיא הקצאות (MB)": [r.peak_mb for r in recs],
+            "שורות נכנסו": pd.array([r.rows_in for r in recs], dtype="Int64"),
+            "שורות יצאו": pd.array([r.rows for r in recs], dtype="Int64"),
+            "הצליח": [r.ok for r in recs],
+        })
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+# ----- ההקשר הפעיל -----
+# contextvar ולא משתנה גלובלי: כל סשן Streamlit ו-thread של עבודת רקע רואים את ה-Diagnostics שלהם
+_current: contextvars.ContextVar = contextvars.ContextVar("placement_diagnostics", default=None)
+_path: contextvars.ContextVar = contextvars.ContextVar("placement_stage_path", default=())
+
+def current_diagnostics() -> Optional[Diagnostics]:
+    return _current.get()
+
+def set_diagnostics(diag: Optional[Diagnostics]) -> None:
+    # להרצה שכולה בהקשר אחד (סקריפט Streamlit); במקום אחר עדיף activate()
+    _current.set(diag)
+
+# ----- שיא הקצאות -----
+# tracemalloc משותף לכל התהליך: reset_peak של שלב פנימי (או של thread אחר) מוחק את השיא של
+# השלבים הפתוחים, ולכן לפני כל איפוס השיא הנוכחי "מקופל" לכל השלבים הפתוחים. בעבודות מקבילות
+# השיא כולל גם הקצאות של העבודה השנייה.
+_lock = threading.Lock()
+_open: list = []          # [base, peak_seen] לכל שלב פתוח שמודד זיכרון
+_owned = False            # tracemalloc הופעל כאן (ולא מבחוץ, למשל על ידי סקריפט המדידה)
+
+def _mem_enter() -> list:
+    global _owned
+    with _lock:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _owned = True
+        cur, peak = tracemalloc.get_traced_memory()
+        for frame in _open:
+            frame[1] = max(frame[1], peak)
+        tracemalloc.reset_peak()
+        frame = [cur, cur]
+        _open.append(frame)
+        return frame
+
+def _mem_exit(frame: list) -> float:
+    global _owned
+    with _lock:
+        peak = max(frame[1], tracemalloc.get_traced_memory()[1]) if tracemalloc.is_tracing() else frame[1]
+        _open.remove(frame)
+        for other in _open:
+            other[1] = max(other[1], peak)
+        if _owned and not _open:
+            tracemalloc.stop()
+            _owned = False
+        return max(peak - frame[0], 0) / 2**20
+
+@contextmanager
+def stage(name: str, rows_in: Optional[int] = None):
+    # with stage("resolve_students", len(df)) as rec: ...; rec.rows = len(out)
+    diag = _current.get()
+    rec = StageRecord(stage=name, rows_in=rows_in)
+    if diag is None:
+        yield rec
+        return
+    path = _path.get() + (name,)
+    token = _path.set(path)
+    rec.stage, rec.run_id, rec.started = "/".join(path), diag.run_id, time.time()
+    frame = _mem_enter() if diag.trace_memory else None
+    t0 = time.perf_counter()
+    try:
+        yield rec
+    except BaseException:
+        rec.ok = False
+        raise
+    finally:
+        rec.seconds = time.perf_counter() - t0
+        if frame is not None:
+            rec.peak_mb = round(_mem_exit(frame), 2)
+        _path.reset(token)
+        diag._add(rec)
+        logger.info(json.dumps({"event": "stage", **asdict(rec)}, ensure_ascii=False))
+
+def _frame_len(x) -> Optional[int]:
+    if isinstance(x, pd.DataFrame):
+        return len(x)
+    if isinstance(x, tuple) and x and isinstance(x[0], pd.DataFrame):
+        return len(x[0])
+    return None
+
+def instrumented(name: str, rows_in: Callable = lambda *a, **k: _frame_len(a[0]) if a else None,
+                 rows: Callable = _frame_len):
+    # עטיפה לפונקציה שלמה; rows_in(*args, **kwargs) ו-rows(result) סופרים שורות
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with stage(name, rows_in(*args, **kwargs)) as rec:
+                out = fn(*args, **kwargs)
+                rec.rows = rows(out)
+                return out
+        return inner
+    return wrap
+
+def enable_json_log(stream=None, level: int = logging.INFO) -> logging.Handler:
+    # שורת JSON אחת לכל שלב (ל-stderr כברירת מחדל); קריאה חוזרת לא מוסיפה handler נוסף
+    for h in logger.handlers:
+        if getattr(h, "_placement_json", False):
+            return h
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    handler._placement_json = True
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return handler
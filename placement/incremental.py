@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+# עדכון שיבוץ קיים: רישומים מאוחרים, ביטולים ושינויי קיבולת/מדריך בלי שיבוץ מחדש של כל המחזור.
+# מי שהשיבוץ שלו/ה עדיין תקף נשאר/ת במקום; רק "המושפעים" – חדשים, מי שפונה מאתר שקטן או
+# ממדריך שעבר את המכסה, ומי שלא שובץ קודם – עוברים שיבוץ חמדני על המקומות הפנויים.
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import instrumented
+from .ingest import normalize_text, resolve_students, share_categories
+from .matching import SUPERVISOR_CAP, PART_COLS, SITE_IDX_COL, greedy_assign, assignments_to_df
+from .scoring import Weights, encode_scoring, score_components
+
+SiteKey = Union[int, str]   # מיקום השורה ב-sites_df, או שם האתר (כל השורות בשם הזה)
+
+@dataclass
+class CohortDiff:
+    added: Optional[pd.DataFrame] = None                         # סטודנטים חדשים (קובץ גולמי או מזוהה)
+    removed_ids: Sequence[str] = ()                              # ת"ז של סטודנטים שירדו
+    capacity: Dict[SiteKey, int] = field(default_factory=dict)   # קיבולת חדשה לאתר
+    supervisors: Dict[SiteKey, str] = field(default_factory=dict)  # מדריך/ה חדש/ה לאתר
+
+    @property
+    def empty(self) -> bool:
+        return ((self.added is None or self.added.empty) and not len(self.removed_ids)
+                and not self.capacity and not self.supervisors)
+
+@dataclass
+class RematchResult:
+    result_df: pd.DataFrame
+    students_df: pd.DataFrame
+    sites_df: pd.DataFrame
+    moves: pd.DataFrame           # רק מי שהשיבוץ שלו/ה השתנה (כולל נוספים והוסרו)
+    unknown_ids: List[str]        # ת"ז להסרה שלא נמצאו במחזור
+    affected: int                 # כמה סטודנטים עברו שיבוץ מחדש
+
+MOVE_COLS = ["ת\"ז הסטודנט", "שם פרטי", "שם משפחה", "אתר קודם", "אתר חדש", "סטטוס", "אחוז התאמה"]
+
+def _site_positions(sites_df: pd.DataFrame, key: SiteKey) -> np.ndarray:
+    if isinstance(key, (int, np.integer)):
+        if not 0 <= key < len(sites_df):
+            raise ValueError(f"אין אתר במיקום {key}")
+        return np.array([int(key)])
+    pos = np.flatnonzero(sites_df["site_name"].astype(str).to_numpy() == normalize_text(key))
+    if not len(pos):
+        raise ValueError(f"אתר לא מוכר: {key}")
+    return pos
+
+def _latest_over(rows: np.ndarray, groups: np.ndarray, limit: np.ndarray) -> np.ndarray:
+    # rows ממוינים לפי סדר הקובץ; מחזיר את השורות שמעבר ל-limit[קבוצה] – המאוחרות בקובץ קודם
+    # (השיבוץ החמדני עובר לפי סדר הקובץ, ולכן הן אלה שהיו נכנסות אחרונות)
+    if not len(rows):
+        return rows
+    rank = pd.Series(groups[::-1]).groupby(groups[::-1]).cumcount().to_numpy()[::-1]
+    count = np.bincount(groups, minlength=len(limit))
+    return rows[rank < np.maximum(count - limit, 0)[groups]]
+
+@instrumented("rematch", rows=lambda r: len(r.result_df))
+def rematch(students_df: pd.DataFrame, sites_df: pd.DataFrame, result_df: pd.DataFrame, diff: CohortDiff,
+            W: Weights, sup_cap: int = SUPERVISOR_CAP) -> RematchResult:
+    # students_df / sites_df: הקלט של הריצה הקודמת (capacity_left מחושב מחדש מ-site_capacity);
+    # result_df: התוצאות שלה, באותו סדר שורות כמו students_df ועם העמודה _site_idx
+    if SITE_IDX_COL not in result_df.columns:
+        raise ValueError("בתוצאות הקודמות חסר מיקום האתר – יש להריץ שיבוץ מלא")
+    ids = students_df["stu_id"].astype(str).to_numpy()
+    if len(result_df) != len(students_df) or (result_df["ת\"ז הסטודנט"].astype(str).to_numpy() != ids).any():
+        raise ValueError("התוצאות הקודמות אינן תואמות את קובץ הסטודנטים")
+    prev = result_df[SITE_IDX_COL].to_numpy(dtype=np.int64)
+    prev_parts = result_df[list(PART_COLS)].to_numpy(dtype=np.int64)
+
+    # ----- החלת השינויים על האתרים -----
+    sites = sites_df.copy()
+    sites["site_capacity"] = sites["site_capacity"].to_numpy(dtype=np.int64)
+    sites["שם המדריך"] = sites["שם המדריך"].astype(object)
+    for key, cap in diff.capacity.items():
+        sites.iloc[_site_positions(sites, key), sites.columns.get_loc("site_capacity")] = max(int(cap), 0)
+    touched_sup = set()
+    for key, name in diff.supervisors.items():
+        name = normalize_text(name)
+        sites.iloc[_site_positions(sites, key), sites.columns.get_loc("שם המדריך")] = name
+        touched_sup.add(name)
+    m = len(sites)
+    capacity = sites["site_capacity"].to_numpy(dtype=np.int64)
+    sup_codes, sup_names = pd.factorize(sites["שם המדריך"])
+
+    # ----- החלת השינויים על הסטודנטים -----
+    removed_ids = {normalize_text(x) for x in diff.removed_ids}
+    gone = np.isin(ids, list(removed_ids))
+    unknown = sorted(removed_ids - set(ids[gone]))
+    keep_rows = np.flatnonzero(~gone)
+    students = students_df.iloc[keep_rows]
+    added = diff.added
+    if added is not None and not added.empty:
+        if "stu_id" not in added.columns:
+            added = resolve_students(added)
+        students = pd.concat([students, added[students.columns]], ignore_index=True)
+    else:
+        students = students.reset_index(drop=True)
+    students, sites = share_categories(students, sites)
+    n_added = len(students) - len(keep_rows)
+
+    chosen = np.concatenate([prev[keep_rows], np.full(n_added, -1, dtype=np.int64)])
+    parts = np.concatenate([prev_parts[keep_rows], np.zeros((n_added, 3), dtype=np.int64)])
+
+    # ----- פינוי: אתרים שקטנו ומדריכים חדשים שעברו את המכסה -----
+    placed = np.flatnonzero(chosen >= 0)
+    chosen[_latest_over(placed, chosen[placed], capacity)] = -1
+    if touched_sup:
+        placed = np.flatnonzero(chosen >= 0)
+        limit = np.where(np.isin(sup_names, list(touched_sup)), sup_cap, np.iinfo(np.int64).max // 2)
+        chosen[_latest_over(placed, sup_codes[chosen[placed]], limit)] = -1
+
+    # ----- שיבוץ מחדש של המושפעים על המקומות הפנויים -----
+    kept = chosen >= 0
+    cap_left = capacity - np.bincount(chosen[kept], minlength=m)
+    affected = np.flatnonzero(~kept)
+    parts[affected] = 0
+    open_sites = np.flatnonzero(cap_left > 0)
+    if len(affected) and len(open_sites):
+        # רק אתרים עם מקום פנוי – המטריצה קטנה גם במחזור גדול; הסדר נשמר, ולכן גם שובר השוויון
+        enc = encode_scoring(students.iloc[affected], sites)
+        f, c, sp = score_components(enc, W, np.arange(len(affected))[:, None], open_sites[None, :])
+        sub_codes, sub_sup = pd.factorize(sup_codes[open_sites])
+        sup_used = np.bincount(sup_codes[chosen[kept]], minlength=len(sup_names))[sub_sup]
+        pick = greedy_assign(np.clip(f + c + sp, 0, 100), cap_left[open_sites], sub_codes, sup_cap, sup_used=sup_used)
+        hit = pick >= 0
+        chosen[affected[hit]] = open_sites[pick[hit]]
+        parts[affected[hit]] = np.stack([f, c, sp], axis=-1)[np.flatnonzero(hit), pick[hit]]
+
+    used = np.bincount(chosen[chosen >= 0], minlength=m)
+    sites["capacity_left"] = capacity - used
+    new_result = assignments_to_df(students, sites, chosen, parts)
+    moves = _moves(result_df, new_result, gone, keep_rows, n_added)
+    return RematchResult(result_df=new_result, students_df=students, sites_df=sites, moves=moves,
+                         unknown_ids=unknown, affected=len(affected))
+
+def _moves(old: pd.DataFrame, new: pd.DataFrame, gone: np.ndarray, keep_rows: np.ndarray, n_added: int) -> pd.DataFrame:
+    base = ["ת\"ז הסטודנט", "שם פרטי", "שם משפחה"]
+    site = "שם מקום ההתמחות"
+    n_kept = len(keep_rows)
+    before = old[site].to_numpy(dtype=object)[keep_rows]
+    after = new[site].to_numpy(dtype=object)[:n_kept]
+    prev_idx = old[SITE_IDX_COL].to_numpy()[keep_rows]
+    new_idx = new[SITE_IDX_COL].to_numpy()[:n_kept]
+    changed = np.flatnonzero(prev_idx != new_idx)
+    status = np.select([prev_idx[changed] < 0, new_idx[changed] < 0], ["שובץ/ה", "שיבוץ בוטל"], "הועבר/ה")
+
+    kept = new.iloc[changed][base].assign(**{"אתר קודם": before[changed], "אתר חדש": after[changed],
+                                             "סטטוס": status, "אחוז התאמה": new["אחוז התאמה"].to_numpy()[changed]})
+    added = new.iloc[n_kept:][base].assign(**{"אתר קודם": "", "אתר חדש": new[site].to_numpy(dtype=object)[n_kept:],
+                                              "סטטוס": "נוסף/ה", "אחוז התאמה": new["אחוז התאמה"].to_numpy()[n_kept:]})
+    removed = old[gone][base].assign(**{"אתר קודם": old[site].to_numpy(dtype=object)[gone], "אתר חדש": "",
+                                        "סטטוס": "הוסר/ה", "אחוז התאמה": 0})
+    frames = [df.astype(object) for df in (kept, added, removed) if len(df)]
+    if not frames:
+        return pd.DataFrame(columns=MOVE_COLS)
+    return pd.concat(frames, ignore_index=True)[MOVE_COLS]
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# קריאת קבצי סטודנטים/אתרים וזיהוי העמודות לפי שמות חלופיים
+import re
+import unicodedata
+from typing import Optional, Any, List, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import instrumented
+
+# עמודות סטודנטים
+STU_COLS = {
+    "id": ["מספר תעודת זהות", "תעודת זהות", "ת\"ז", "תז", "תעודת זהות הסטודנט"],
+    "first": ["שם פרטי"],
+    "last": ["שם משפחה"],
+    "address": ["כתובת", "כתובת הסטודנט", "רחוב"],
+    "city": ["עיר מגורים", "עיר"],
+    "phone": ["טלפון", "מספר טלפון"],
+    "email": ["דוא\"ל", "דוא״ל", "אימייל", "כתובת אימייל", "כתובת מייל"],
+    "preferred_field": ["תחום מועדף","תחומים מועדפים"],
+    "special_req": ["בקשה מיוחדת"],
+    "partner": ["בן/בת זוג להכשרה", "בן\\בת זוג להכשרה", "בן/בת זוג", "בן\\בת זוג"]
+}
+
+# עמודות אתרים
+SITE_COLS = {
+    "name": ["מוסד / שירות הכשרה", "מוסד", "שם מוסד ההתמחות", "שם המוסד", "מוסד ההכשרה"],
+    "field": ["תחום ההתמחות", "תחום התמחות"],
+    "street": ["רחוב"],
+    "city": ["עיר"],
+    "capacity": ["מספר סטודנטים שניתן לקלוט השנה", "מספר סטודנטים שניתן לקלוט", "קיבולת"],
+    "sup_first": ["שם פרטי"],
+    "sup_last": ["שם משפחה"],
+    "phone": ["טלפון"],
+    "email": ["אימייל", "כתובת מייל", "דוא\"ל", "דוא״ל"],
+    "review": ["חוות דעת מדריך"]
+}
+
+# העמודות שהשיבוץ באמת משתמש בהן – רק הן נקראות מהקובץ (שאר העמודות בקבצי הרשם לא נטענות)
+STUDENT_FIELDS = {k: STU_COLS[k] for k in ["id", "first", "last", "city", "preferred_field", "special_req"]}
+# חוות דעת המדריך (SITE_COLS["review"]) לא נקראת: אף שיטת שיבוץ לא משתמשת בה
+SITE_FIELDS = {k: SITE_COLS[k] for k in ["name", "field", "city", "capacity", "sup_first", "sup_last"]}
+# עמודות עם מעט ערכים חוזרים – נשמרות כ-category; כל השאר כמחרוזות
+CATEGORY_FIELDS = {"city", "field", "preferred_field"}
+CSV_CHUNK_ROWS = 100_000
+
+def pick_col(df: pd.DataFrame, options: List[str]) -> Optional[str]:
+    for opt in options:
+        if opt in df.columns: return opt
+    return None
+
+def select_columns(header: List[str], fields: dict) -> dict:
+    # שם עמודה בקובץ → dtype, לפי הכינוי הראשון שנמצא לכל שדה (אותו סדר כמו pick_col)
+    dtypes = {}
+    for key, options in fields.items():
+        col = next((opt for opt in options if opt in header), None)
+        if col is not None and col not in dtypes:
+            dtypes[col] = "category" if key in CATEGORY_FIELDS else "string"
+    return dtypes
+
+# ----- קריאת קבצים -----
+def _file_name(uploaded) -> str:
+    # קובץ שהועלה (עם .name) או נתיב בדיסק
+    return str(getattr(uploaded, "name", uploaded) or "").lower()
+
+def _rewind(uploaded) -> None:
+    if hasattr(uploaded, "seek"):
+        uploaded.seek(0)
+
+def _csv_header(uploaded) -> List[str]:
+    header = pd.read_csv(uploaded, nrows=0, encoding="utf-8-sig").columns.tolist()
+    _rewind(uploaded)
+    return header
+
+def _pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def read_csv_chunks(uploaded, fields: dict, chunksize: int = CSV_CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    # קריאה במקטעים – לקבצי CSV גדולים שלא כדאי לפענח בבת אחת
+    dtypes = select_columns(_csv_header(uploaded), fields)
+    yield from pd.read_csv(uploaded, encoding="utf-8-sig", usecols=list(dtypes), dtype=dtypes, chunksize=chunksize)
+
+def _concat_chunks(chunks: Iterator[pd.DataFrame]) -> pd.DataFrame:
+    # איחוד מקטעים בלי לאבד את ה-category (קטגוריות שונות בכל מקטע)
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+    out = pd.concat(chunks, ignore_index=True)
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            out[col] = pd.api.types.union_categoricals([c[col] for c in chunks]) if len(chunks) > 1 else chunks[0][col]
+    return out
+
+def _read_csv(uploaded, fields: Optional[dict], chunksize: Optional[int]) -> pd.DataFrame:
+    if fields is None:
+        return pd.read_csv(uploaded, encoding="utf-8-sig")
+    if chunksize:
+        return _concat_chunks(read_csv_chunks(uploaded, fields, chunksize))
+    header = _csv_header(uploaded)
+    dtypes = select_columns(header, fields)
+    if _pyarrow_available():
+        # סדר העמודות כמו בקובץ – כמו usecols של pandas
+        return _read_csv_arrow(uploaded, {c: dtypes[c] for c in header if c in dtypes})
+    return pd.read_csv(uploaded, encoding="utf-8-sig", usecols=list(dtypes), dtype=dtypes)
+
+def _read_csv_arrow(uploaded, dtypes: dict) -> pd.DataFrame:
+    # הקורא של pyarrow עם טיפוס מחרוזת מפורש לכל עמודה – בלי הסקת מספרים, כך שת"ז כמו 021834942
+    # נשארת עם האפס המוביל, בדיוק כמו במנוע C עם dtype (וכמו read_csv_chunks); תא ריק → חסר
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+    cols = list(dtypes)
+    options = pa_csv.ConvertOptions(include_columns=cols, column_types={c: pa.string() for c in cols},
+                                    strings_can_be_null=True)
+    return pa_csv.read_csv(uploaded, convert_options=options).to_pandas().astype(dtypes)
+
+def _read_xlsx(uploaded, fields: dict) -> pd.DataFrame:
+    # openpyxl במצב read-only: השורות נקראות בזרימה ורק העמודות הנדרשות נשמרות
+    from openpyxl import load_workbook
+    wb = load_workbook(uploaded, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [("" if h is None else str(h)) for h in next(rows, ())]
+        dtypes = select_columns(header, fields)
+        idx = [header.index(col) for col in dtypes]
+        data = {col: [] for col in dtypes}
+        for row in rows:
+            if row is None or all(v is None for v in row):
+                continue
+            for col, i in zip(dtypes, idx):
+                v = row[i] if i < len(row) else None
+                data[col].append(None if v is None else str(v))
+    finally:
+        wb.close()
+    return pd.DataFrame({col: pd.Series(vals, dtype=dtypes[col]) for col, vals in data.items()})
+
+@instrumented("read_any", rows_in=lambda *a, **k: None)
+def read_any(uploaded, fields: Optional[dict] = None, chunksize: Optional[int] = None) -> pd.DataFrame:
+    # fields: מפת כינויים (STUDENT_FIELDS / SITE_FIELDS) – נקראות רק העמודות שלה, עם dtype מפורש.
+    # בלי fields נקרא כל הקובץ כמו קודם.
+    name = _file_name(uploaded)
+    if name.endswith(".xlsx") and fields is not None:
+        return _read_xlsx(uploaded, fields)
+    if name.endswith((".xlsx",".xls")):
+        if fields is None:
+            return pd.read_excel(uploaded)
+        header = pd.read_excel(uploaded, nrows=0).columns.astype(str).tolist()
+        _rewind(uploaded)
+        dtypes = select_columns(header, fields)
+        return pd.read_excel(uploaded, usecols=list(dtypes), dtype=dtypes)
+    return _read_csv(uploaded, fields, chunksize)
+
+# ----- נרמול טקסט -----
+# גרש/גרשיים עבריים ומירכאות "חכמות" → ASCII (דוא״ל ו-דוא"ל הם אותו ערך); סימני כיווניות
+# ותווים בלתי נראים (מהעתקה מוורד/אקסל) נמחקים; רצף רווחים (כולל רווח קשיח) → רווח אחד.
+# מחרוזות רגילות ולא raw: ה-\u הופך לתו עצמו, וכך התבניות עובדות גם ב-RE2 של pyarrow.
+# הרווחים ברשימה מפורשת ולא \s: ב-RE2 \s הוא ASCII בלבד וב-re של פייתון גם Unicode, ואז
+# רווח צר (U+2009, U+202F – נפוצים ביצוא של מערכות הרשם) היה מנורמל רק בנתיב של תא בודד.
+# הרשימה = כל מה ש-\s של פייתון תופס (ומה ש-str.strip מסיר)
+_SPACES = "[\t\n\x0b\x0c\r \x1c-\x1f\x85\u00a0\u1680\u2000-\u200a\u2028\u2029\u202f\u205f\u3000]+"
+_TEXT_RULES = [
+    ("[\u05f4\u201c\u201d\u201e]", '"'),
+    ("[\u05f3\u2018\u2019]", "'"),
+    ("[\u200b-\u200f\u202a-\u202e\u2066-\u2069\ufeff]", ""),
+    (_SPACES, " "),
+]
+_TEXT_RULES_RE = [(re.compile(pat), repl) for pat, repl in _TEXT_RULES]
+CITY_FIELD_COLS = {"stu_city": "site_city", "stu_pref": "site_field"}
+# העמודות שנשארות אחרי resolve_*
+STU_RESOLVED = ["stu_id", "stu_first", "stu_last", "stu_city", "stu_pref", "stu_req"]
+SITE_RESOLVED = ["site_name", "site_field", "site_city", "site_capacity", "capacity_left", "שם המדריך"]
+
+def normalize_text(x: Any) -> str:
+    if x is None or (not isinstance(x, str) and pd.isna(x)): return ""
+    x = unicodedata.normalize("NFC", str(x))
+    for pat, repl in _TEXT_RULES_RE:
+        x = pat.sub(repl, x)
+    return x.strip()
+
+def _normalize_strings(s: pd.Series) -> pd.Series:
+    s = s.astype("string[pyarrow]" if _pyarrow_available() else "string").fillna("").str.normalize("NFC")
+    for pat, repl in _TEXT_RULES:
+        s = s.str.replace(pat, repl, regex=True)
+    return s.str.strip()
+
+def normalize_series(s: pd.Series, category: bool = False) -> pd.Series:
+    # אותו נרמול כמו normalize_text, בפעולות .str על כל העמודה
+    # מנרמלים רק את הערכים הייחודיים (ערים/תחומים חוזרים אלפי פעמים) ומרכיבים מחדש לפי הקודים
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories.astype(str)
+    else:
+        codes, uniques = pd.factorize(s)
+    uniques = _normalize_strings(pd.Series(uniques, dtype=object)).to_numpy(dtype=object)
+    vals = uniques[codes] if len(uniques) else np.full(len(s), "", dtype=object)
+    out = pd.Series(np.where(codes >= 0, vals, ""), index=s.index, dtype=object)
+    return out.astype("category") if category else out
+
+# ----- סטודנטים -----
+@instrumented("resolve_students")
+def resolve_students(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    out["stu_id"] = out[pick_col(out, STU_COLS["id"])]
+    out["stu_first"] = out[pick_col(out, STU_COLS["first"])]
+    out["stu_last"]  = out[pick_col(out, STU_COLS["last"])]
+    out["stu_city"]  = out[pick_col(out, STU_COLS["city"])] if pick_col(out, STU_COLS["city"]) else ""
+    out["stu_pref"]  = out[pick_col(out, STU_COLS["preferred_field"])] if pick_col(out, STU_COLS["preferred_field"]) else ""
+    out["stu_req"]   = out[pick_col(out, STU_COLS["special_req"])] if pick_col(out, STU_COLS["special_req"]) else ""
+    for c in STU_RESOLVED:
+        out[c] = normalize_series(out[c], category=c in CITY_FIELD_COLS)
+    return out[STU_RESOLVED]  # עמודות הקובץ המקוריות לא נשמרות אחרי הזיהוי
+
+# ----- אתרים -----
+@instrumented("resolve_sites")
+def resolve_sites(df: pd.DataFrame) -> pd.DataFrame:
+    out = df.copy()
+    out["site_name"]  = out[pick_col(out, SITE_COLS["name"])]
+    out["site_field"] = out[pick_col(out, SITE_COLS["field"])]
+    out["site_city"]  = out[pick_col(out, SITE_COLS["city"])]
+    cap_col = pick_col(out, SITE_COLS["capacity"])
+    out["site_capacity"] = pd.to_numeric(out[cap_col], errors="coerce").fillna(1).astype(int) if cap_col else 1
+    out["capacity_left"] = out["site_capacity"].astype(int)
+    sup_first = pick_col(out, SITE_COLS["sup_first"])
+    sup_last  = pick_col(out, SITE_COLS["sup_last"])
+    out["שם המדריך"] = ""
+    if sup_first or sup_last:
+        ff = out[sup_first].astype("string").fillna("") if sup_first else ""
+        ll = out[sup_last].astype("string").fillna("")  if sup_last else ""
+        out["שם המדריך"] = (ff + " " + ll).astype(str).str.strip()
+    for c in ["site_name","site_field","site_city","שם המדריך"]:
+        out[c] = normalize_series(out[c], category=c in CITY_FIELD_COLS.values())
+    return out[SITE_RESOLVED]
+
+# ----- קטגוריות משותפות -----
+@instrumented("share_categories")
+def share_categories(students_df: pd.DataFrame, sites_df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # עיר ותחום בשני הקבצים מקבלים אותו CategoricalDtype – קוד שווה ⇔ ערך שווה,
+    # והשיבוץ משווה מספרים שלמים במקום מחרוזות. מחזיר עותקים רדודים (המקור לא משתנה).
+    students_df, sites_df = students_df.copy(deep=False), sites_df.copy(deep=False)
+    for stu_col, site_col in CITY_FIELD_COLS.items():
+        if stu_col not in students_df.columns or site_col not in sites_df.columns:
+            continue
+        a, b = students_df[stu_col], sites_df[site_col]
+        if isinstance(a.dtype, pd.CategoricalDtype) and a.dtype == b.dtype:
+            continue
+        dtype = pd.CategoricalDtype(pd.Index(np.concatenate([_categories(a), _categories(b)])).unique())
+        students_df[stu_col], sites_df[site_col] = _as_category(a, dtype), _as_category(b, dtype)
+    return students_df, sites_df
+
+def _as_category(s: pd.Series, dtype: pd.CategoricalDtype) -> pd.Series:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.set_categories(dtype.categories)  # קידוד מחדש לפי שם הקטגוריה, בלי לעבור על המחרוזות
+    return s.astype(object).fillna("").astype(dtype)
+
+def _categories(s: pd.Series) -> np.ndarray:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.categories.to_numpy(dtype=object)
+    return pd.unique(s.astype(object).fillna("").to_numpy(dtype=object))
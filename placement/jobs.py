@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# עבודות שיבוץ ברקע: מאגר threads משותף לכל הסשנים, התקדמות (סטודנטים/שנייה) וביטול.
+# סקריפט ה-Streamlit רק שולח עבודה ובודק את מצבה, כך שה-rerun של אף סשן לא ממתין לשיבוץ.
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+import pandas as pd
+
+from .matching import MATCHERS
+from .scoring import Weights
+from .sweep import run_sweep
+
+JOB_WORKERS = int(os.environ.get("PLACEMENT_JOB_WORKERS", str(min(4, os.cpu_count() or 1))))
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="placement-job")
+    return _executor
+
+class MatchJob:
+    def __init__(self, mode: str, total: int, sites_df: Optional[pd.DataFrame] = None):
+        self.mode = mode
+        self.run_id = ""                  # מזהה הריצה שתישמר בסיום (גם תג רשומות האבחון)
+        self.sites_df = sites_df          # המנוע מעדכן כאן את capacity_left
+        self.total = total                # סטודנטים (שיבוץ) או נקודות ברשת (ניתוח רגישות)
+        self.done = 0
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.future: Optional[Future] = None
+        self._cancel = threading.Event()
+
+    def _progress(self, done: int, total: int) -> None:
+        # DA יכול "לשחרר" סטודנטים בחזרה – הפס לא זז אחורה
+        self.done, self.total = max(self.done, done), total
+
+    def cancel(self) -> None:
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def running(self) -> bool:
+        return self.future is not None and not self.future.done()
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def rate(self) -> float:
+        # יחידות (סטודנטים/נקודות) לשנייה
+        return self.done / self.elapsed if self.elapsed > 0 else 0.0
+
+    def result(self, timeout: Optional[float] = None) -> pd.DataFrame:
+        # מחזיר את התוצאה (result_df / טבלת ההשוואה), או מעלה את החריגה של העבודה (MatchCancelled בביטול)
+        return self.future.result(timeout)
+
+def submit_match(mode: str, students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                 **kwargs) -> MatchJob:
+    if mode not in MATCHERS:
+        raise ValueError(f"שיטת שיבוץ לא מוכרת: {mode}")
+    job = MatchJob(mode, len(students_df), sites_df)
+    return _submit(job, MATCHERS[mode], students_df, sites_df, W, **kwargs)
+
+def submit_sweep(students_df: pd.DataFrame, sites_df: pd.DataFrame, grid, mode: str = "greedy",
+                 **kwargs) -> MatchJob:
+    # ה-thread רק מתזמן את מאגר התהליכים של run_sweep וממתין לו
+    job = MatchJob("sweep", len(grid))
+    return _submit(job, run_sweep, students_df, sites_df, grid, mode=mode, **kwargs)
+
+def _submit(job: MatchJob, fn, *args, **kwargs) -> MatchJob:
+    def run():
+        try:
+            return fn(*args, progress=job._progress, cancel=job._cancel.is_set, **kwargs)
+        finally:
+            job.finished = time.perf_counter()
+
+    # ההקשר של השולח (ובו ה-Diagnostics הפעיל) עובר ל-thread של העבודה
+    job.future = _pool().submit(contextvars.copy_context().run, run)
+    return job
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+# מנועי השיבוץ: חמדני, אופטימלי (זרימה בעלות מינימלית) ויציב (Deferred Acceptance)
+import heapq
+from collections import deque
+from functools import lru_cache
+from typing import Optional, List, Sequence, Callable
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import instrumented, stage
+from .scoring import (Weights, ScoreEncoding, ScoreCandidates, LazyScoreRows, SPARSE_MIN_CELLS, encode_scoring,
+                      score_components, student_types, type_representatives, type_score_table, score_candidates,
+                      base_score)
+
+# ====== שיבוץ ======
+SUPERVISOR_CAP = 2  # מותר עד 2 סטודנטים לכל מדריך (ניתן לשנות לפי צורך)
+UNMATCHED = "לא שובץ"
+SITE_IDX_COL = "_site_idx"  # מיקום האתר ב-sites_df בתוצאות (-1 = לא שובץ)
+# התקדמות וביטול: progress(שטופלו, סה"כ) נקרא כל PROGRESS_EVERY סטודנטים;
+# cancel() שמחזיר True עוצר את המנוע בחריגה MatchCancelled
+ProgressFn = Callable[[int, int], None]
+CancelFn = Callable[[], bool]
+PROGRESS_EVERY = 256
+
+class MatchCancelled(Exception):
+    pass
+
+def _tick(done: int, total: int, progress: Optional[ProgressFn], cancel: Optional[CancelFn]) -> None:
+    if cancel is not None and cancel():
+        raise MatchCancelled()
+    if progress is not None:
+        progress(done, total)
+
+# רכיבי הציון של השיבוץ שנבחר – עמודות מספריות קומפקטיות (במקום מילון לכל שורה)
+PART_COLS = {"_field_pts": "התאמת תחום", "_city_pts": "מרחק/גיאוגרפיה", "_special_pts": "בקשות מיוחדות"}
+
+def greedy_assign(total: np.ndarray, capacity: np.ndarray, sup_codes: np.ndarray,
+                  sup_cap: int = SUPERVISOR_CAP, sup_used: Optional[np.ndarray] = None,
+                  progress: Optional[ProgressFn] = None, cancel: Optional[CancelFn] = None,
+                  rows: Optional[np.ndarray] = None, candidates: Optional[ScoreCandidates] = None) -> np.ndarray:
+    # מחזיר לכל סטודנט את אינדקס האתר (מיקום) שנבחר, או -1 אם לא שובץ.
+    # הבחירה: הציון הגבוה ביותר מבין האתרים הפנויים שהמדריך שלהם לא הגיע למכסה;
+    # אם אין כאלה – הציון הגבוה ביותר מבין כל האתרים הפנויים. בשוויון – האתר המוקדם בקובץ.
+    # הגרסה הקודמת (sort_values לא יציב) בחרה בשוויון אתר שרירותי, ולכן התוצאות זהות לה רק עד
+    # שבירת השוויון: אותם ציונים לכל סטודנט/ית, אבל לפעמים אתר אחר מבין השקולים.
+    # rows: שורת total של כל סטודנט (למשל טבלה לפי סוג סטודנט); ברירת מחדל – שורה i.
+    # candidates: מועמדים דלילים לכל שורת total (ציון ≥ סף, ממוינים) – נבדקים קודם, ושורה צפופה
+    # של total (יכולה להיות LazyScoreRows) נקראת רק כשאף מועמד/ת לא זמין/ה
+    n = len(rows) if rows is not None else total.shape[0]
+    m = total.shape[1]
+    cap = np.asarray(capacity, dtype=np.int64).copy()
+    sup_codes = np.asarray(sup_codes, dtype=np.int64)
+    n_sup = int(sup_codes.max()) + 1 if m else 0
+    sup_count = np.zeros(n_sup, dtype=np.int64)
+    if sup_used is not None:
+        sup_count[:len(sup_used)] = sup_used
+    # אינדקס אתרים לפי מדריך – לסגירת כל אתרי המדריך בבת אחת
+    by_sup = np.argsort(sup_codes, kind="stable")
+    sup_bounds = np.searchsorted(sup_codes[by_sup], np.arange(n_sup + 1))
+
+    open_mask = cap > 0                 # נשאר מקום באתר
+    allowed = open_mask & (sup_count[sup_codes] < sup_cap)  # ... וגם המדריך לא הגיע למכסה
+    n_open = int(open_mask.sum())
+    chosen = np.full(n, -1, dtype=np.int64)
+
+    for i in range(n):
+        if n_open == 0:
+            break
+        if i % PROGRESS_EVERY == 0:
+            _tick(i, n, progress, cancel)
+        pool = allowed if allowed.any() else open_mask
+        r = i if rows is None else rows[i]
+        j = -1
+        if candidates is not None:
+            cand = candidates.row(r)
+            hit = np.flatnonzero(pool[cand])
+            if len(hit):
+                j = int(cand[hit[0]])
+        if j < 0:
+            j = int(np.argmax(np.where(pool, total[r], np.int16(-1))))  # uint8 + -1 → int16
+        chosen[i] = j
+
+        cap[j] -= 1
+        if cap[j] == 0:
+            open_mask[j] = False
+            allowed[j] = False
+            n_open -= 1
+        s = sup_codes[j]
+        sup_count[s] += 1
+        if sup_count[s] == sup_cap:
+            allowed[by_sup[sup_bounds[s]:sup_bounds[s + 1]]] = False
+    if progress is not None:
+        progress(n, n)
+    return chosen
+
+def assignments_to_df(students_df: pd.DataFrame, sites_df: pd.DataFrame,
+                      chosen: np.ndarray, parts: np.ndarray) -> pd.DataFrame:
+    # בניית result_df מתוך מערך השיבוצים (אותה צורה לכל מנועי השיבוץ).
+    # parts: מערך N×3 של רכיבי הציון (תחום, עיר, בקשות) לכל סטודנט; אפסים למי שלא שובץ
+    matched = chosen >= 0
+    cols = chosen[matched]
+
+    def site_col(col: str, empty: str = "") -> np.ndarray:
+        vals = np.full(len(chosen), empty, dtype=object)
+        vals[matched] = sites_df[col].to_numpy(dtype=object)[cols]
+        return vals
+
+    score = np.where(matched, np.clip(parts.sum(axis=1), 0, 100), 0)
+    # רכיבים בטווח 0..255 (המשקלות הרגילים) נשמרים כ-uint8
+    dtype = np.uint8 if parts.size == 0 or (parts.min() >= 0 and parts.max() <= 255) else np.int16
+    parts = np.where(matched[:, None], parts, 0).astype(dtype)
+
+    return pd.DataFrame({
+        "ת\"ז הסטודנט": students_df["stu_id"].to_numpy(dtype=object),
+        "שם פרטי": students_df["stu_first"].to_numpy(dtype=object),
+        "שם משפחה": students_df["stu_last"].to_numpy(dtype=object),
+        "שם מקום ההתמחות": site_col("site_name", UNMATCHED),
+        "עיר המוסד": site_col("site_city"),
+        "תחום ההתמחות במוסד": site_col("site_field"),
+        "שם המדריך": site_col("שם המדריך"),
+        # >>> דרישת המרצים: אחוז התאמה מספר שלם
+        "אחוז התאמה": score,
+        **{col: parts[:, k] for k, col in enumerate(PART_COLS)},
+        SITE_IDX_COL: chosen.astype(np.int32),
+    })
+
+def score_breakdown(result_df: pd.DataFrame, i: int) -> dict:
+    # פירוק הציון של שורה אחת בתוצאות – נבנה רק כשמבקשים להציג אותו
+    row = result_df.iloc[int(i)]
+    parts = {label: int(row[col]) if col in result_df.columns else 0 for col, label in PART_COLS.items()}
+    parts["עדיפויות הסטודנט/ית"] = 0  # אין קלט דירוג מפורש; נשאר 0 לשקיפות
+    return parts
+
+# ====== מנועים על מערכים מקודדים ======
+# כל מנוע מקבל את הקידוד (ScoreEncoding), המשקלות, הקיבולת הפנויה וקודי המדריכים ומחזיר
+# לכל סטודנט אינדקס אתר (-1 = לא שובץ). עטיפות ה-*_match מוסיפות את הקריאה מה-DataFrame
+# ואת טבלת התוצאות; ניתוח רגישות ועבודות אצווה קוראים למנועים ישירות.
+def _apply_assignment(students_df: pd.DataFrame, sites_df: pd.DataFrame, enc: ScoreEncoding, W: Weights,
+                      chosen: np.ndarray) -> pd.DataFrame:
+    used = np.bincount(chosen[chosen >= 0], minlength=len(sites_df))
+    sites_df["capacity_left"] = sites_df["capacity_left"].to_numpy() - used
+    rows = np.flatnonzero(chosen >= 0)
+    parts = np.zeros((len(chosen), 3), dtype=np.int64)
+    parts[rows] = np.stack(score_components(enc, W, rows, chosen[rows]), axis=1)
+    return assignments_to_df(students_df, sites_df, chosen, parts)
+
+def _run_engine(assign, students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights, **kwargs) -> pd.DataFrame:
+    with stage("encode", len(students_df)):
+        enc = encode_scoring(students_df, sites_df)
+        sup_codes, _ = pd.factorize(sites_df["שם המדריך"])
+    with stage("assign", len(students_df)) as rec:
+        chosen = assign(enc, W, sites_df["capacity_left"].to_numpy(), sup_codes, **kwargs)
+        rec.rows = int((chosen >= 0).sum())
+    with stage("assignments_to_df", len(chosen)) as rec:
+        out = _apply_assignment(students_df, sites_df, enc, W, chosen)
+        rec.rows = len(out)
+    return out
+
+def greedy_chosen(enc: ScoreEncoding, W: Weights, capacity: np.ndarray, sup_codes: np.ndarray,
+                  sup_cap: int = SUPERVISOR_CAP, progress: Optional[ProgressFn] = None,
+                  cancel: Optional[CancelFn] = None) -> np.ndarray:
+    # ציונים לפי סוג סטודנט (ולא N×M); מעל SPARSE_MIN_CELLS – מועמדים דלילים ושורות לפי דרישה
+    _tick(0, len(enc.near), progress, cancel)
+    with stage("score", len(enc.near)):
+        stu_type, total, candidates = _greedy_scores(enc, W)
+    # כולל את בדיקת הקיבולת ומכסת המדריכים
+    with stage("greedy_assign", len(enc.near)):
+        return greedy_assign(total, capacity, sup_codes, sup_cap, progress=progress, cancel=cancel,
+                             rows=stu_type, candidates=candidates)
+
+def _greedy_scores(enc: ScoreEncoding, W: Weights):
+    stu_type, rep = type_representatives(enc)
+    if len(rep) * len(enc.site_city) <= SPARSE_MIN_CELLS:
+        return type_score_table(enc, W) + (None,)
+    return stu_type, LazyScoreRows(enc, W, rep), score_candidates(enc, W, rep)
+
+@instrumented("greedy_match")
+def greedy_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                 progress: Optional[ProgressFn] = None, cancel: Optional[CancelFn] = None) -> pd.DataFrame:
+    return _run_engine(greedy_chosen, students_df, sites_df, W, progress=progress, cancel=cancel)
+
+def _offsets_within(keys: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    # keys ממוינים; ההיסט המצטבר של counts מתחילת הקבוצה של כל רשומה
+    excl = np.cumsum(counts) - counts
+    return excl - excl[np.searchsorted(keys, keys)]
+
+# ====== שיבוץ אופטימלי גלובלי (זרימה בעלות מינימלית) ======
+# הציון תלוי רק ב"סוג" הסטודנט (עיר, תחום מועדף, בקשת קרבה) וב"מחלקת" האתר (עיר, תחום),
+# ולכן הרשת נבנית על סוגים ומחלקות ולא על זוגות בודדים:
+#   סוג סטודנט --(ציון)--> מחלקת אתרים --> אתר [≤ קיבולת] --> מדריך [≤ SUPERVISOR_CAP]
+# זוג בלי אף התאמה (תחום/עיר) מקבל תמיד את ציון הבסיס, ולכן כל הזוגות האלה עוברים
+# דרך צומת "בסיס" אחד; קשתות ישירות נבנות רק לזוגות עם בונוס – הרשת נשארת דלילה.
+# הקיבולת מיוצגת כחסם על קשת האתר (בלי שכפול שורות). מטריצת האילוצים של רשת זרימה
+# היא אוניםודולרית לחלוטין, ולכן פתרון בסיסי של ה-LP (HiGHS) הוא שלם.
+def optimal_chosen(enc: ScoreEncoding, W: Weights, capacity: np.ndarray, sup_codes: np.ndarray,
+                   sup_cap: int = SUPERVISOR_CAP, progress: Optional[ProgressFn] = None,
+                   cancel: Optional[CancelFn] = None) -> np.ndarray:
+    # ה-LP נפתר בקריאה אחת – ההתקדמות מדווחת לפני ואחרי, והביטול נבדק בין השלבים
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    n, m = len(enc.near), len(enc.site_city)
+    stu_type = student_types(enc)
+    site_class = (pd.DataFrame({"city": enc.site_city, "field": enc.site_field})
+                  .groupby(["city", "field"], sort=False).ngroup().to_numpy())
+    sup_codes = np.asarray(sup_codes, dtype=np.int64)
+    cap = np.maximum(np.asarray(capacity, dtype=np.int64), 0)
+    chosen = np.full(n, -1, dtype=np.int64)
+
+    _tick(0, n, progress, cancel)
+    if n and m and cap.sum() > 0:
+        _, stu_rep = np.unique(stu_type, return_index=True)
+        _, site_rep = np.unique(site_class, return_index=True)
+        T, C, S = len(stu_rep), len(site_rep), int(sup_codes.max()) + 1
+        base = base_score(W)
+
+        # קשתות ישירות: רק זוגות (סוג, מחלקה) שהציון שלהם שונה מציון הבסיס
+        e_t, e_c, e_w = [], [], []
+        block = max(1, 2_000_000 // C)
+        for t0 in range(0, T, block):
+            r = stu_rep[t0:t0 + block]
+            f, c, sp = score_components(enc, W, r[:, None], site_rep[None, :])
+            tot = np.clip(f + c + sp, 0, 100)
+            tt, cc = np.nonzero(tot != base)
+            e_t.append(tt + t0); e_c.append(cc); e_w.append(tot[tt, cc])
+        e_t, e_c, e_w = np.concatenate(e_t), np.concatenate(e_c), np.concatenate(e_w).astype(float)
+        E = len(e_t)
+
+        # משתנים: [קשתות ישירות E | סוג→בסיס T | בסיס→מחלקה C | אתרים M]
+        o_in, o_out, o_z = E, E + T, E + T + C
+        n_var = o_z + m
+        c_obj = np.concatenate([-e_w, np.full(T, -float(base)), np.zeros(C + m)])
+        # אי-שוויונות: סוג t ≤ מספר הסטודנטים מהסוג; מדריך s ≤ sup_cap
+        ub_rows = np.concatenate([e_t, np.arange(T), T + sup_codes])
+        ub_cols = np.concatenate([np.arange(E), o_in + np.arange(T), o_z + np.arange(m)])
+        A_ub = sparse.csr_matrix((np.ones(len(ub_rows)), (ub_rows, ub_cols)), shape=(T + S, n_var))
+        b_ub = np.concatenate([np.bincount(stu_type, minlength=T), np.full(S, sup_cap)]).astype(float)
+        # שימור זרימה: מחלקה c (שורות 0..C-1) וצומת הבסיס (שורה C)
+        eq_rows = np.concatenate([e_c, np.full(T, C), np.full(C, C), np.arange(C), site_class])
+        eq_cols = np.concatenate([np.arange(E), o_in + np.arange(T), o_out + np.arange(C), o_out + np.arange(C), o_z + np.arange(m)])
+        eq_vals = np.concatenate([np.ones(E), np.ones(T), -np.ones(C), np.ones(C), -np.ones(m)])
+        A_eq = sparse.csr_matrix((eq_vals, (eq_rows, eq_cols)), shape=(C + 1, n_var))
+        upper = np.concatenate([np.full(o_z, np.inf), cap.astype(float)])
+        res = linprog(c_obj, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=np.zeros(C + 1),
+                      bounds=np.column_stack([np.zeros(n_var), upper]), method="highs-ds")
+        if res.status != 0:
+            raise RuntimeError(f"פתרון השיבוץ האופטימלי נכשל: {res.message}")
+        flow = np.rint(res.x).astype(np.int64)
+        _tick(n // 2, n, progress, cancel)
+
+        # זוגות (סוג, מחלקה, כמות): קשתות ישירות + צימוד שרירותי של הזרימה דרך צומת הבסיס
+        pt, pc, pk = [e_t], [e_c], [flow[:E]]
+        hub_t = np.repeat(np.arange(T), flow[o_in:o_out])
+        hub_c = np.repeat(np.arange(C), flow[o_out:o_z])
+        pt.append(hub_t); pc.append(hub_c); pk.append(np.ones(len(hub_t), dtype=np.int64))
+        pt, pc, pk = np.concatenate(pt), np.concatenate(pc), np.concatenate(pk)
+        keep = pk > 0
+        pt, pc, pk = pt[keep], pc[keep], pk[keep]
+
+        # פירוק לשיבוצים: בכל מחלקה – מושבים לפי סדר האתרים בקובץ,
+        # ובכל סוג – הסטודנטים לפי סדר הקובץ (כולם שקולים מבחינת הציון)
+        z = flow[o_z:]
+        site_order = np.argsort(site_class, kind="stable")
+        seats = np.repeat(site_order, z[site_order])                 # מושבים ממוינים לפי מחלקה
+        seat_start = np.concatenate([[0], np.cumsum(np.bincount(site_class[seats], minlength=C))])
+        stu_order = np.argsort(stu_type, kind="stable")
+        stu_start = np.concatenate([[0], np.cumsum(np.bincount(stu_type, minlength=T))])
+        order = np.lexsort((pt, pc))                                  # לפי מחלקה
+        pt, pc, pk = pt[order], pc[order], pk[order]
+        seat_off = seat_start[pc] + _offsets_within(pc, pk)
+        order = np.lexsort((pc, pt))                                  # לפי סוג
+        pt, pc, pk, seat_off = pt[order], pc[order], pk[order], seat_off[order]
+        stu_off = stu_start[pt] + _offsets_within(pt, pk)
+        idx = np.repeat(np.arange(len(pk)), pk)
+        within = np.arange(pk.sum()) - np.repeat(np.cumsum(pk) - pk, pk)
+        chosen[stu_order[stu_off[idx] + within]] = seats[seat_off[idx] + within]
+
+        # מי שנשאר בחוץ בגלל מכסת המדריכים – אותו מנגנון חלופי כמו בשיבוץ החמדני
+        left = np.flatnonzero(chosen < 0)
+        cap_left = cap - np.bincount(chosen[chosen >= 0], minlength=m)
+        if len(left) and cap_left.sum() > 0:
+            sup_used = np.bincount(sup_codes[chosen[chosen >= 0]], minlength=S)
+            _, total, candidates = _greedy_scores(enc, W)
+            extra = greedy_assign(total, cap_left, sup_codes, sup_cap, sup_used=sup_used, cancel=cancel,
+                                  rows=stu_type[left], candidates=candidates)
+            chosen[left[extra >= 0]] = extra[extra >= 0]
+
+    if progress is not None:
+        progress(n, n)
+    return chosen
+
+@instrumented("optimal_match")
+def optimal_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                  sup_cap: int = SUPERVISOR_CAP, progress: Optional[ProgressFn] = None,
+                  cancel: Optional[CancelFn] = None) -> pd.DataFrame:
+    return _run_engine(optimal_chosen, students_df, sites_df, W, sup_cap=sup_cap, progress=progress, cancel=cancel)
+
+# ====== שיבוץ יציב (Deferred Acceptance – הסטודנטים מציעים) ======
+# העדפות הסטודנטים: לפי מטריצת הציונים (בשוויון – האתר המוקדם בקובץ).
+# העדפות האתרים: דירוג לקסיקוגרפי לפי רשימת קריטריונים (site_rank), ובשוויון – מי שמוקדם בקובץ.
+SITE_RANK_KEYS = {
+    "field": "התאמת תחום",
+    "city": "אותה עיר",
+    "special": "בקשת קרבה בעיר האתר",
+    "score": "אחוז התאמה",
+}
+DEFAULT_SITE_RANK = ("field", "city", "score")
+
+def stable_chosen(enc: ScoreEncoding, W: Weights, capacity: np.ndarray, sup_codes: Optional[np.ndarray] = None,
+                  site_rank: Sequence[str] = DEFAULT_SITE_RANK, progress: Optional[ProgressFn] = None,
+                  cancel: Optional[CancelFn] = None) -> np.ndarray:
+    # כל אתר מחזיק ערימת-מינימום חסומה בגודל הקיבולת שלו; בראש הערימה – הסטודנט המועדף פחות,
+    # ולכן קבלה/דחייה של הצעה היא O(log קיבולת). מכסת המדריכים אינה חלק מהמודל היציב.
+    unknown = [k for k in site_rank if k not in SITE_RANK_KEYS]
+    if unknown:
+        raise ValueError(f"קריטריון דירוג לא מוכר: {unknown}")
+    n, m = len(enc.near), len(enc.site_city)
+    cap = np.maximum(np.asarray(capacity, dtype=np.int64), 0)
+    open_sites = np.flatnonzero(cap > 0)
+    stu_type = student_types(enc)
+    _, type_rep = np.unique(stu_type, return_index=True)
+
+    @lru_cache(maxsize=1024)
+    def ranked(t: int):
+        # אתרים לפי סדר ההעדפה של סוג הסטודנט, ועדיפות הסוג בעיני כל אתר (מספר שלם, גבוה = עדיף).
+        # סטודנטים מאותו סוג נבדלים רק בשובר השוויון (סדר הקובץ) שמתווסף בנפרד.
+        i = int(type_rep[t])
+        rows = np.full(len(open_sites), i)
+        f, c, sp = score_components(enc, W, rows, open_sites)
+        score = np.clip(f + c + sp, 0, 100)
+        same_city = (enc.stu_city[i] >= 0) & (enc.site_city[open_sites] == enc.stu_city[i])
+        values = {
+            "field": (enc.pref_hit[enc.stu_pref[i], enc.site_field[open_sites]], 2),
+            "city": (same_city, 2),
+            "special": (same_city & enc.near[i], 2),
+            "score": (score, 101),
+        }
+        prio = np.zeros(len(open_sites), dtype=np.int64)
+        for k in site_rank:
+            v, base = values[k]
+            prio = prio * base + v
+        order = np.argsort(-score, kind="stable")
+        return open_sites[order], prio[order] * (n + 1)
+
+    held: List[list] = [[] for _ in range(m)]
+    # העדיפות של המוחזק/ת הפחות מועדף/ת באתר מלא (-1 = יש מקום). הסף רק עולה,
+    # ולכן הצעה שאינה עוברת אותו תידחה בוודאות וניתן לדלג עליה בסריקה וקטורית אחת.
+    worst = np.full(m, -1, dtype=np.int64)
+    next_choice = np.zeros(n, dtype=np.int64)
+    free = deque(range(n))
+    steps = 0
+    while free:
+        if steps % PROGRESS_EVERY == 0:
+            _tick(n - len(free), n, progress, cancel)  # מי שמוחזק/ת כרגע או שהרשימה שלו/ה מוצתה
+        steps += 1
+        i = free.popleft()
+        sites_i, prio_t = ranked(int(stu_type[i]))
+        start = next_choice[i]
+        tie = n - i                        # שובר שוויון: מוקדם בקובץ = עדיף
+        hits = np.flatnonzero(prio_t[start:] + tie > worst[sites_i[start:]])
+        if not len(hits):
+            next_choice[i] = len(sites_i)  # רשימה מוצתה – הסטודנט/ית לא שובץ/ה
+            continue
+        k = start + int(hits[0])
+        next_choice[i] = k + 1
+        j = int(sites_i[k])
+        heap = held[j]
+        heapq.heappush(heap, (int(prio_t[k]) + tie, i))
+        if len(heap) > cap[j]:
+            _, rejected = heapq.heappop(heap)
+            free.append(rejected)
+        if len(heap) == cap[j]:
+            worst[j] = heap[0][0]
+
+    if progress is not None:
+        progress(n, n)
+    chosen = np.full(n, -1, dtype=np.int64)
+    for j, heap in enumerate(held):
+        for _, i in heap:
+            chosen[i] = j
+    return chosen
+
+@instrumented("stable_match")
+def stable_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                 site_rank: Sequence[str] = DEFAULT_SITE_RANK, progress: Optional[ProgressFn] = None,
+                 cancel: Optional[CancelFn] = None) -> pd.DataFrame:
+    return _run_engine(stable_chosen, students_df, sites_df, W, site_rank=site_rank, progress=progress, cancel=cancel)
+
+MATCHERS = {
+    "greedy": greedy_match,
+    "optimal": optimal_match,
+    "stable": stable_match,
+}
+ASSIGNERS = {
+    "greedy": greedy_chosen,
+    "optimal": optimal_chosen,
+    "stable": stable_chosen,
+}
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+# דוחות התוצאות וייצוא XLSX
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import instrumented, stage
+from .matching import SITE_IDX_COL
+from .scoring import Weights, encode_scoring, top_k_sites
+
+# ---- יצירת XLSX ----
+MATCH_COL = "אחוז התאמה"
+XLSX_CHUNK_ROWS = 5_000
+
+def _sheet_title(name: str, used: set) -> str:
+    # שם גיליון חוקי באקסל: עד 31 תווים, בלי []:*?/\ וייחודי בחוברת
+    title = "".join("_" if ch in '[]:*?/\\' else ch for ch in str(name)).strip() or "גיליון"
+    title = title[:31]
+    k = 2
+    while title in used:
+        suffix = f" ({k})"
+        title = title[:31 - len(suffix)] + suffix
+        k += 1
+    used.add(title)
+    return title
+
+def write_xlsx(sheets, output, leading: Optional[Tuple[str, Callable[[], pd.DataFrame]]] = None) -> None:
+    # כתיבה זורמת (constant_memory של XlsxWriter): כל שורה נכתבת לקובץ זמני ומשוחררת,
+    # כך שהחוברת לא נבנית כולה בזיכרון. sheets: מילון או רצף זוגות (שם, DataFrame);
+    # אפשר להעביר generator כדי שכל גיליון ייבנה רק כשמגיע תורו.
+    # leading: (שם, פונקציה) – הגיליון הראשון בחוברת, שנבנה רק אחרי כל השאר (למשל סיכום שלהם)
+    import xlsxwriter
+    items = sheets.items() if isinstance(sheets, dict) else sheets
+    with stage("write_xlsx") as rec:
+        rec.rows = _write_sheets(xlsxwriter.Workbook(output, {"constant_memory": True}), items, leading)
+
+def _write_sheets(workbook, items, leading=None) -> int:
+    # הכותרת כמו ב-DataFrame.to_excel שכתב את הקבצים קודם (מודגש, מסגרת דקה, ממורכז, צמוד למעלה);
+    # עמודת אחוז ההתאמה באדום – כמו קודם
+    formats = (workbook.add_format({"bold": True, "border": 1, "align": "center", "valign": "top"}),
+               workbook.add_format({"font_color": "red"}))
+    used = set()
+    total = 0
+    try:
+        # גיליון נפרד נכתב בקובץ זמני משלו, ולכן אפשר למלא את הראשון אחרי האחרים
+        first = workbook.add_worksheet(_sheet_title(leading[0], used)) if leading else None
+        for name, df in items:
+            total += _write_sheet(workbook.add_worksheet(_sheet_title(name, used)), df, formats)
+        if first is not None:
+            total += _write_sheet(first, leading[1](), formats)
+    finally:
+        workbook.close()
+    return total
+
+def _write_sheet(worksheet, df: pd.DataFrame, formats) -> int:
+    header_fmt, red_fmt = formats
+    cols = list(df.columns)
+    if MATCH_COL in cols:
+        cols = [c for c in cols if c != MATCH_COL] + [MATCH_COL]
+        worksheet.set_column(len(cols) - 1, len(cols) - 1, 12, red_fmt)
+    worksheet.write_row(0, 0, [str(c) for c in cols], header_fmt)
+    row = 1
+    for start in range(0, len(df), XLSX_CHUNK_ROWS):
+        block = df[cols].iloc[start:start + XLSX_CHUNK_ROWS].astype(object)
+        for values in block.where(block.notna(), None).itertuples(index=False, name=None):
+            worksheet.write_row(row, 0, values)
+            row += 1
+    return row - 1
+
+def df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "שיבוץ") -> bytes:
+    return workbook_bytes({sheet_name: df})
+
+def workbook_bytes(sheets) -> bytes:
+    xlsx_io = BytesIO()
+    write_xlsx(sheets, xlsx_io)
+    return xlsx_io.getvalue()
+
+# ---- טבלת התוצאות המרכזית לפי סדר/תוויות המרצים ----
+@instrumented("results_table")
+def results_table(result_df: pd.DataFrame) -> pd.DataFrame:
+    df_show = pd.DataFrame({
+        "אחוז התאמה": result_df["אחוז התאמה"].astype(int),
+        "שם הסטודנט/ית": (result_df["שם פרטי"].astype(str) + " " + result_df["שם משפחה"].astype(str)).str.strip(),
+        "תעודת זהות": result_df["ת\"ז הסטודנט"],
+        "תחום התמחות": result_df["תחום ההתמחות במוסד"],
+        "עיר המוסד": result_df["עיר המוסד"],
+        "שם מקום ההתמחות": result_df["שם מקום ההתמחות"],
+        "שם המדריך/ה": result_df["שם המדריך"],
+    })
+    # מיון מהגבוה לנמוך (ללא סטטוס/סף)
+    return df_show.sort_values("אחוז התאמה", ascending=False)
+
+# ---- דוח סיכום לפי מקום הכשרה (כמות/שמות) ----
+@instrumented("summary_table")
+def summary_table(result_df: pd.DataFrame) -> pd.DataFrame:
+    # השמות מחוברים בעמודה אחת ואז join אחד לכל קבוצה (בסדר הקובץ) – בלי רשימות ובלי apply לכל שורה
+    names = result_df["שם פרטי"].astype(str) + " " + result_df["שם משפחה"].astype(str)
+    return (
+        result_df.assign(_name=names)
+        .groupby(["שם מקום ההתמחות","תחום ההתמחות במוסד","שם המדריך"], observed=True)
+        .agg(**{"כמה סטודנטים": ("ת\"ז הסטודנט", "count"), "המלצת שיבוץ": ("_name", " + ".join)})
+        .reset_index()
+    )
+
+# ---- דוח קיבולות: קיבולת/שובצו/יתרה ----
+@instrumented("capacity_table")
+def capacity_table(result_df: pd.DataFrame, sites_df: pd.DataFrame) -> pd.DataFrame:
+    caps = sites_df.groupby("site_name", observed=True)["site_capacity"].sum()
+    assigned = result_df.groupby("שם מקום ההתמחות", observed=True)["ת\"ז הסטודנט"].count()
+    capacity = caps.to_numpy(dtype=np.int64)
+    used = assigned.reindex(caps.index, fill_value=0).to_numpy(dtype=np.int64)
+    return pd.DataFrame({
+        "שם מקום ההתמחות": caps.index.to_numpy(dtype=object),
+        "קיבולת": capacity,
+        "שובצו בפועל": used,
+        "יתרה/חוסר": capacity - used,
+    }).sort_values("שם מקום ההתמחות")
+
+# ---- דוח ריכוזי פר־מורה ----
+ALL_TEACHERS = "(כולם)"
+
+def teacher_names(result_df: pd.DataFrame) -> list:
+    return sorted([x for x in result_df["שם המדריך"].unique() if str(x).strip() != ""])
+
+def teacher_table(result_df: pd.DataFrame, teacher: str = ALL_TEACHERS) -> pd.DataFrame:
+    df_for_teacher = result_df
+    if teacher != ALL_TEACHERS:
+        df_for_teacher = df_for_teacher[df_for_teacher["שם המדריך"] == teacher]
+    return pd.DataFrame({
+        "שם הסטודנט/ית": (df_for_teacher["שם פרטי"].astype(str) + " " + df_for_teacher["שם משפחה"].astype(str)).str.strip(),
+        "תעודת זהות": df_for_teacher["ת\"ז הסטודנט"],
+        "שם מקום ההתמחות": df_for_teacher["שם מקום ההתמחות"],
+        "אחוז התאמה": df_for_teacher["אחוז התאמה"].astype(int)
+    }).sort_values("אחוז התאמה", ascending=False)
+
+# ---- כל הדוחות של ריצה, פעם אחת בסיום השיבוץ ----
+TEACHER_COLS = ["שם הסטודנט/ית", "תעודת זהות", "שם מקום ההתמחות", "אחוז התאמה"]
+
+@dataclass
+class RunReports:
+    results: pd.DataFrame
+    summary: pd.DataFrame
+    capacity: Optional[pd.DataFrame]    # None בלי טבלת אתרים
+    teachers: pd.DataFrame               # שורות עם מדריך/ה, לפי סדר השמות ואז אחוז התאמה יורד
+    teacher_rows: Dict[str, Tuple[int, int]]  # מדריך/ה → טווח השורות שלו/ה ב-teachers
+
+    @property
+    def teacher_names(self) -> list:
+        return list(self.teacher_rows)
+
+    def teacher(self, name: str = ALL_TEACHERS) -> pd.DataFrame:
+        # חיתוך של טבלה מוכנה – בלי סינון ובלי מיון
+        if name == ALL_TEACHERS:
+            return self.results[TEACHER_COLS]
+        start, stop = self.teacher_rows.get(name, (0, 0))
+        return self.teachers.iloc[start:stop]
+
+    def surplus(self) -> list:
+        # אתרים עם מקומות פנויים
+        return [] if self.capacity is None else self.capacity.loc[self.capacity["יתרה/חוסר"] > 0, "שם מקום ההתמחות"].tolist()
+
+    def overflow(self) -> list:
+        # אתרים עם עודף שיבוץ
+        return [] if self.capacity is None else self.capacity.loc[self.capacity["יתרה/חוסר"] < 0, "שם מקום ההתמחות"].tolist()
+
+def _teacher_rows(results: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Tuple[int, int]]]:
+    # מיון אחד לפי (מדריך/ה, אחוז התאמה יורד); results כבר ממוינת לפי הציון, ולכן מיון יציב לפי המדריך מספיק
+    names = np.array(sorted(x for x in results["שם המדריך/ה"].unique() if str(x).strip() != ""), dtype=object)
+    codes = pd.Categorical(results["שם המדריך/ה"].to_numpy(dtype=object), categories=names).codes
+    keep = np.flatnonzero(codes >= 0)
+    order = keep[np.argsort(codes[keep], kind="stable")]
+    ends = np.cumsum(np.bincount(codes[keep], minlength=len(names)))
+    starts = ends - np.bincount(codes[keep], minlength=len(names))
+    rows = {name: (int(a), int(b)) for name, a, b in zip(names, starts, ends)}
+    return results[TEACHER_COLS].iloc[order], rows
+
+@instrumented("build_reports")
+def build_reports(result_df: pd.DataFrame, sites_df: Optional[pd.DataFrame] = None) -> RunReports:
+    results = results_table(result_df)
+    teachers, rows = _teacher_rows(results)
+    has_sites = sites_df is not None and not sites_df.empty
+    return RunReports(results=results, summary=summary_table(result_df),
+                      capacity=capacity_table(result_df, sites_df) if has_sites else None,
+                      teachers=teachers, teacher_rows=rows)
+
+# ---- חלופות: k האתרים הבאים בתור לכל סטודנט/ית ----
+DEFAULT_ALTERNATIVES = 3
+
+@instrumented("alternatives_table")
+def alternatives_table(students_df: pd.DataFrame, sites_df: pd.DataFrame, result_df: pd.DataFrame,
+                       W: Weights, k: int = DEFAULT_ALTERNATIVES) -> pd.DataFrame:
+    # students_df באותו סדר שורות כמו result_df; אתרים בלי קיבולת בכלל אינם חלופה,
+    # והאתר שבו הסטודנט/ית שובץ/ה לא נספר. "מקומות פנויים" – אחרי השיבוץ (capacity_left)
+    chosen = result_df[SITE_IDX_COL].to_numpy() if SITE_IDX_COL in result_df.columns else None
+    feasible = sites_df["site_capacity"].to_numpy() > 0
+    idx, scores = top_k_sites(encode_scoring(students_df, sites_df), W, k, exclude=chosen, feasible=feasible)
+    rows, rank = np.nonzero(idx >= 0)
+    site = idx[rows, rank]
+
+    def site_col(col: str) -> np.ndarray:
+        return sites_df[col].to_numpy(dtype=object)[site]
+
+    name = (result_df["שם פרטי"].astype(str) + " " + result_df["שם משפחה"].astype(str)).str.strip().to_numpy(dtype=object)
+    return pd.DataFrame({
+        "תעודת זהות": result_df["ת\"ז הסטודנט"].to_numpy(dtype=object)[rows],
+        "שם הסטודנט/ית": name[rows],
+        "שיבוץ נוכחי": result_df["שם מקום ההתמחות"].to_numpy(dtype=object)[rows],
+        "חלופה": rank + 1,
+        "שם מקום ההתמחות": site_col("site_name"),
+        "עיר המוסד": site_col("site_city"),
+        "תחום התמחות": site_col("site_field"),
+        "שם המדריך/ה": site_col("שם המדריך"),
+        "מקומות פנויים": sites_df["capacity_left"].to_numpy()[site].astype(int),
+        "אחוז התאמה": scores[rows, rank].astype(int),
+    })
+
+# ---- חוברת אחת: תוצאות, סיכום, קיבולות, חלופות וגיליון לכל מורה ----
+def report_sheets(result_df: pd.DataFrame, sites_df: pd.DataFrame = None, alternatives: pd.DataFrame = None,
+                  reports: Optional[RunReports] = None):
+    # reports: הדוחות המוכנים של הריצה (אם כבר חושבו); גיליונות המורים הם חיתוכים שלהם
+    reports = reports or build_reports(result_df, sites_df)
+    yield "תוצאות", reports.results
+    yield "סיכום", reports.summary
+    if reports.capacity is not None:
+        yield "קיבולות", reports.capacity
+    if alternatives is not None:
+        yield "חלופות", alternatives
+    for teacher in reports.teacher_names:
+        yield teacher, reports.teacher(teacher)
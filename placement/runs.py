@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# מאגר ריצות מקומי: כל ריצה נשמרת בתיקייה משלה (קבצי Parquet + meta.json) ונטענת מחדש בלי שיבוץ.
+# כך ריענון דפדפן או הפעלה מחדש של השרת לא מאבדים את התוצאות, ואפשר להשוות שתי ריצות.
+import json
+import os
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, asdict
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .matching import UNMATCHED
+from .scoring import Weights
+from .store import arrow_to_pandas
+
+RUNS_DIR = os.environ.get("PLACEMENT_RUNS_DIR") or os.path.join(os.path.expanduser("~"), ".placement", "runs")
+RUN_TABLES = ("students_df", "sites_df", "result_df", "sites_after")
+META_FILE = "meta.json"
+
+@dataclass
+class RunMeta:
+    run_id: str
+    created: float          # time.time() בזמן השמירה
+    mode: str
+    weights: Weights
+    students: int
+    unmatched: int
+    label: str = ""
+
+    def to_json(self) -> dict:
+        return {**asdict(self), "weights": asdict(self.weights)}
+
+    @classmethod
+    def from_json(cls, data: dict) -> "RunMeta":
+        return cls(**{**data, "weights": Weights(**data["weights"])})
+
+@dataclass
+class RunSnapshot:
+    meta: RunMeta
+    students_df: pd.DataFrame
+    sites_df: pd.DataFrame      # קלט האתרים (capacity_left = site_capacity)
+    result_df: pd.DataFrame
+    sites_after: pd.DataFrame   # האתרים אחרי השיבוץ
+
+def new_run_id() -> str:
+    # ממוין לפי זמן (עד אלפית שנייה) ועדיין ייחודי
+    now = time.time()
+    return time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now % 1 * 1000):03d}-" + uuid.uuid4().hex[:6]
+
+class RunStore:
+    def __init__(self, root: str = RUNS_DIR):
+        self.root = root
+
+    def _path(self, run_id: str) -> str:
+        if not run_id or os.sep in run_id or run_id.startswith("."):
+            raise ValueError(f"מזהה ריצה לא חוקי: {run_id}")
+        return os.path.join(self.root, run_id)
+
+    def save(self, students_df: pd.DataFrame, sites_df: pd.DataFrame, result_df: pd.DataFrame,
+             sites_after: pd.DataFrame, W: Weights, mode: str, label: str = "",
+             run_id: Optional[str] = None) -> RunMeta:
+        # נכתב לתיקייה זמנית ומועבר למקומו בבת אחת – ריצה חלקית לא נראית ברשימה
+        run_id = run_id or new_run_id()
+        meta = RunMeta(run_id=run_id, created=time.time(), mode=mode, weights=W, students=len(result_df),
+                       unmatched=int((result_df["שם מקום ההתמחות"] == UNMATCHED).sum()), label=label)
+        final = self._path(run_id)
+        tmp = os.path.join(self.root, f".tmp-{run_id}-{uuid.uuid4().hex[:6]}")
+        os.makedirs(tmp)
+        try:
+            tables = dict(students_df=students_df, sites_df=sites_df, result_df=result_df, sites_after=sites_after)
+            for name, df in tables.items():
+                df.reset_index(drop=True).to_parquet(os.path.join(tmp, f"{name}.parquet"), index=False)
+            with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+                json.dump(meta.to_json(), f, ensure_ascii=False)
+            if os.path.exists(final):
+                shutil.rmtree(final)
+            os.replace(tmp, final)
+        except BaseException:
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        return meta
+
+    def meta(self, run_id: str) -> RunMeta:
+        with open(os.path.join(self._path(run_id), META_FILE), encoding="utf-8") as f:
+            return RunMeta.from_json(json.load(f))
+
+    def load(self, run_id: str) -> RunSnapshot:
+        path = self._path(run_id)
+        if not os.path.isfile(os.path.join(path, META_FILE)):
+            raise KeyError(f"ריצה לא נמצאה: {run_id}")
+        import pyarrow.parquet as pq
+        tables = {name: arrow_to_pandas(pq.read_table(os.path.join(path, f"{name}.parquet"))) for name in RUN_TABLES}
+        return RunSnapshot(meta=self.meta(run_id), **tables)
+
+    def run_ids(self) -> List[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((d for d in os.listdir(self.root)
+                       if not d.startswith(".") and os.path.isfile(os.path.join(self.root, d, META_FILE))),
+                      reverse=True)
+
+    def list(self) -> pd.DataFrame:
+        rows = []
+        for run_id in self.run_ids():
+            try:
+                m = self.meta(run_id)
+            except (OSError, ValueError, KeyError, TypeError):
+                continue  # ריצה פגומה לא מפילה את הרשימה
+            rows.append({"מזהה ריצה": m.run_id, "נוצר": time.strftime("%Y-%m-%d %H:%M", time.localtime(m.created)),
+                         "שיטה": m.mode, "סטודנטים": m.students, "לא שובצו": m.unmatched, "תיאור": m.label,
+                         "משקלות": f"{m.weights.w_field:g}/{m.weights.w_city:g}/{m.weights.w_special:g}"})
+        return pd.DataFrame(rows, columns=["מזהה ריצה", "נוצר", "שיטה", "סטודנטים", "לא שובצו", "תיאור", "משקלות"])
+
+    def delete(self, run_id: str) -> None:
+        shutil.rmtree(self._path(run_id), ignore_errors=True)
+
+# ====== השוואת שתי ריצות ======
+@dataclass
+class RunDiff:
+    moves: pd.DataFrame      # סטודנטים שהאתר או הציון שלהם השתנו (כולל נוספו/הוסרו)
+    capacity: pd.DataFrame   # אתרים שהקיבולת או מספר המשובצים בהם השתנו
+    summary: dict
+
+def diff_runs(a: RunSnapshot, b: RunSnapshot) -> RunDiff:
+    # a = ריצת הבסיס, b = הריצה החדשה; סטודנטים מזוהים לפי ת"ז ואתרים לפי שם
+    cols = ["ת\"ז הסטודנט", "שם פרטי", "שם משפחה", "שם מקום ההתמחות", "אחוז התאמה"]
+    left, right = (r.result_df[cols].astype({"ת\"ז הסטודנט": str}) for r in (a, b))
+    both = left.merge(right, on="ת\"ז הסטודנט", how="outer", suffixes=(" א", " ב"), indicator=True)
+    in_a, in_b = both["_merge"].ne("right_only").to_numpy(), both["_merge"].ne("left_only").to_numpy()
+    site_a = both["שם מקום ההתמחות א"].astype(object).where(in_a, "").to_numpy(dtype=object)
+    site_b = both["שם מקום ההתמחות ב"].astype(object).where(in_b, "").to_numpy(dtype=object)
+    score_a = both["אחוז התאמה א"].fillna(0).to_numpy(dtype=np.int64)
+    score_b = both["אחוז התאמה ב"].fillna(0).to_numpy(dtype=np.int64)
+    status = np.select(
+        [~in_a, ~in_b, site_a == site_b, site_a == UNMATCHED, site_b == UNMATCHED],
+        ["נוסף/ה", "הוסר/ה", "אותו אתר", "שובץ/ה", "שיבוץ בוטל"], "עבר/ה אתר")
+    changed = (site_a != site_b) | (score_a != score_b)
+    first = both["שם פרטי ב"].fillna(both["שם פרטי א"]).astype(str)
+    last = both["שם משפחה ב"].fillna(both["שם משפחה א"]).astype(str)
+    moves = pd.DataFrame({
+        "תעודת זהות": both["ת\"ז הסטודנט"].to_numpy(dtype=object),
+        "שם הסטודנט/ית": (first + " " + last).str.strip().to_numpy(dtype=object),
+        "אתר בריצה א": site_a, "אתר בריצה ב": site_b,
+        "אחוז התאמה א": score_a, "אחוז התאמה ב": score_b, "שינוי בציון": score_b - score_a,
+        "סטטוס": status,
+    })[changed].reset_index(drop=True)
+
+    def per_site(r: RunSnapshot) -> pd.DataFrame:
+        cap = r.sites_df.groupby("site_name", observed=True)["site_capacity"].sum()
+        used = r.result_df.groupby("שם מקום ההתמחות", observed=True).size()
+        return pd.DataFrame({"קיבולת": cap, "שובצו": used.reindex(cap.index, fill_value=0)})
+
+    sa, sb = per_site(a), per_site(b)
+    cap = sa.join(sb, how="outer", lsuffix=" א", rsuffix=" ב").fillna(0).astype(np.int64)
+    cap["שינוי קיבולת"] = cap["קיבולת ב"] - cap["קיבולת א"]
+    cap["שינוי במשובצים"] = cap["שובצו ב"] - cap["שובצו א"]
+    cap = cap[(cap["שינוי קיבולת"] != 0) | (cap["שינוי במשובצים"] != 0)]
+    cap = cap.rename_axis("שם מקום ההתמחות").reset_index()
+
+    matched_a, matched_b = in_a & (site_a != UNMATCHED), in_b & (site_b != UNMATCHED)
+    summary = {
+        "עברו אתר": int((status == "עבר/ה אתר").sum()),
+        "שובצו (לא שובצו קודם)": int((status == "שובץ/ה").sum()),
+        "שיבוץ בוטל": int((status == "שיבוץ בוטל").sum()),
+        "נוספו": int((~in_a).sum()),
+        "הוסרו": int((~in_b).sum()),
+        "ממוצע התאמה א": round(float(score_a[matched_a].mean()), 2) if matched_a.any() else None,
+        "ממוצע התאמה ב": round(float(score_b[matched_b].mean()), 2) if matched_b.any() else None,
+        "אתרים עם שינוי קיבולת": int((cap["שינוי קיבולת"] != 0).sum()),
+    }
+    return RunDiff(moves=moves, capacity=cap, summary=summary)
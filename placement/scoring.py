@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+# מודל הניקוד: ציון לזוג בודד, ומטריצת ציונים וקטורית לכל המחזור
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, List, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ingest import share_categories
+
+# ====== מודל ניקוד ======
+@dataclass
+class Weights:
+    w_field: float = 0.50
+    w_city: float = 0.05
+    w_special: float = 0.45
+
+# ====== תחומים מועדפים ======
+# "תחומים מועדפים" יכול להכיל כמה תחומים: "חינוך מיוחד, נוער" / "רווחה; זקנה".
+# אתר מתאים בתחום אם אחד מהם מופיע (כמחרוזת משנה) בתחום האתר.
+# "/" אינו מפריד: הוא חלק משמות תחומים ("נוער/צעירים") ונשאר בתוך האסימון
+PREF_SEP = r"\s*[,;|\n]\s*"
+
+def split_prefs(pref: Optional[str]) -> List[str]:
+    return [t for t in re.split(PREF_SEP, pref or "") if t]
+
+def field_match(pref: Optional[str], site_field: Optional[str]) -> bool:
+    return any(t in (site_field or "") for t in split_prefs(pref))
+
+# ====== חישוב ציון ======
+def compute_score(stu: pd.Series, site: pd.Series, W: Weights) -> float:
+    same_city = (stu.get("stu_city") and site.get("site_city") and stu.get("stu_city") == site.get("site_city"))
+    field_s   = 90.0 if field_match(stu.get("stu_pref"), site.get("site_field","")) else 60.0
+    city_s    = 100.0 if same_city else 65.0
+    special_s = 90.0 if "קרוב" in stu.get("stu_req","") and same_city else 70.0
+    score = W.w_field*field_s + W.w_city*city_s + W.w_special*special_s
+    return float(np.clip(score, 0, 100))
+
+# --- גרסה עם פירוט מרכיבים (לשבירת הציון) ---
+def compute_score_with_explain(stu: pd.Series, site: pd.Series, W: Weights):
+    same_city = (stu.get("stu_city") and site.get("site_city") and stu.get("stu_city") == site.get("site_city"))
+    field_s   = 90.0 if field_match(stu.get("stu_pref"), site.get("site_field","")) else 60.0
+    city_s    = 100.0 if same_city else 65.0
+    special_s = 90.0 if "קרוב" in stu.get("stu_req","") and same_city else 70.0
+
+    parts = {
+        "התאמת תחום": round(W.w_field*field_s),
+        "מרחק/גיאוגרפיה": round(W.w_city*city_s),
+        "בקשות מיוחדות": round(W.w_special*special_s),
+        "עדיפויות הסטודנט/ית": 0  # אין קלט דירוג מפורש בקובץ זה; נשאר 0 לשקיפות
+    }
+    score = int(np.clip(sum(parts.values()), 0, 100))
+    return score, parts
+
+# ====== מטריצת ציונים וקטורית (N סטודנטים × M אתרים) ======
+@dataclass
+class ScoreMatrix:
+    field: np.ndarray    # נקודות "התאמת תחום"
+    city: np.ndarray     # נקודות "מרחק/גיאוגרפיה"
+    special: np.ndarray  # נקודות "בקשות מיוחדות"
+    total: np.ndarray    # אחוז התאמה (שלם, 0..100)
+
+    def parts(self, i: int, j: int) -> dict:
+        return {
+            "התאמת תחום": int(self.field[i, j]),
+            "מרחק/גיאוגרפיה": int(self.city[i, j]),
+            "בקשות מיוחדות": int(self.special[i, j]),
+            "עדיפויות הסטודנט/ית": 0
+        }
+
+    def take(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        # רכיבי הציון (תחום, עיר, בקשות) לזוגות נבחרים – מערך k×3
+        return np.stack([self.field[rows, cols], self.city[rows, cols], self.special[rows, cols]], axis=1)
+
+def _text_values(df: pd.DataFrame, col: str) -> np.ndarray:
+    if col not in df.columns:
+        return np.full(len(df), "", dtype=object)
+    vals = df[col].astype(object)
+    return vals.where(vals.notna(), "").astype(str).to_numpy(dtype=object)
+
+@dataclass
+class ScoreEncoding:
+    stu_city: np.ndarray    # קוד עיר משותף לשני הצדדים (-1 = ריק)
+    site_city: np.ndarray
+    stu_pref: np.ndarray    # קוד תחום מועדף (אינדקס לשורות pref_hit, רק ערכי הסטודנטים)
+    site_field: np.ndarray  # קוד תחום האתר (אינדקס לעמודות pref_hit, רק ערכי האתרים)
+    pref_hit: np.ndarray    # טבלת התאמות: ערך "תחום מועדף" ייחודי × תחום אתר ייחודי
+    near: np.ndarray        # בקשה מיוחדת שכוללת "קרוב"
+
+# ====== אינדקס תחומים ======
+# במקום לבדוק "מחרוזת בתוך מחרוזת" לכל זוג סטודנט×אתר: כל אסימון תחום מועדף ייחודי נבדק פעם
+# אחת מול כל תחומי האתרים הייחודיים (חיפוש וקטורי), והתאמת סטודנט היא איחוד הקבוצות של אסימוניו.
+@dataclass
+class FieldIndex:
+    fields: np.ndarray             # תחומי אתר ייחודיים (הקוד = המיקום במערך)
+    sites: Dict[str, np.ndarray]   # אסימון → קודי התחומים שמכילים אותו
+
+    def lookup(self, pref: str) -> np.ndarray:
+        hits = [self.sites[t] for t in split_prefs(pref) if t in self.sites]
+        return np.unique(np.concatenate(hits)) if hits else np.empty(0, dtype=np.int64)
+
+def build_field_index(prefs: np.ndarray, fields: np.ndarray) -> FieldIndex:
+    tokens = sorted({t for p in prefs for t in split_prefs(p)})
+    haystack = pd.Series(fields, dtype=object).astype("string")
+    sites = {t: np.flatnonzero(haystack.str.contains(t, regex=False).to_numpy(dtype=bool)) for t in tokens}
+    return FieldIndex(fields=np.asarray(fields, dtype=object), sites=sites)
+
+def field_hits(index: FieldIndex, prefs: np.ndarray) -> np.ndarray:
+    # מטריצת התאמה: ערך תחום מועדף × תחום אתר, מחיפושי קבוצות באינדקס
+    hit = np.zeros((len(prefs), len(index.fields)), dtype=bool)
+    for i, p in enumerate(prefs):
+        hit[i, index.lookup(p)] = True
+    return hit
+
+def _shared_codes(students_df: pd.DataFrame, sites_df: pd.DataFrame, stu_col: str, site_col: str):
+    # קודי קטגוריה משותפים לשני הצדדים (share_categories) + רשימת הערכים; עמודה חסרה = ""
+    stu = students_df[[stu_col]] if stu_col in students_df.columns else pd.DataFrame({stu_col: [""] * len(students_df)})
+    site = sites_df[[site_col]] if site_col in sites_df.columns else pd.DataFrame({site_col: [""] * len(sites_df)})
+    stu, site = share_categories(stu, site)
+    cats = stu[stu_col].cat.categories.to_numpy(dtype=object)
+    return stu[stu_col].cat.codes.to_numpy(np.int64), site[site_col].cat.codes.to_numpy(np.int64), cats
+
+def encode_scoring(students_df: pd.DataFrame, sites_df: pd.DataFrame) -> ScoreEncoding:
+    # עיר: השוואת קודים משותפים במקום מחרוזות ("" או חסר → -1, לא שווה לאף עיר)
+    stu_city, site_city, cities = _shared_codes(students_df, sites_df, "stu_city", "site_city")
+    empty = np.flatnonzero(cities == "")
+    if len(empty):
+        stu_city = np.where(stu_city == empty[0], -1, stu_city)
+        site_city = np.where(site_city == empty[0], -1, site_city)
+
+    # התאמת תחום: אינדקס אסימונים על הערכים הייחודיים, לא בדיקה לכל זוג
+    stu_pref, site_field, fields = _shared_codes(students_df, sites_df, "stu_pref", "site_field")
+    fields = np.where(pd.isna(fields), "", fields).astype(str).astype(object)
+    # ערך חסר (קוד -1) → "" בסוף הרשימה, בלי אסימונים ובלי התאמות
+    fields = np.append(fields, "")
+    stu_pref, site_field = np.where(stu_pref < 0, len(fields) - 1, stu_pref), np.where(site_field < 0, len(fields) - 1, site_field)
+    # הטבלה היא ערכי הסטודנטים × ערכי האתרים בלבד, לא איחוד הקטגוריות של שני הצדדים בריבוע
+    pref_codes, stu_pref = np.unique(stu_pref, return_inverse=True)
+    field_codes, site_field = np.unique(site_field, return_inverse=True)
+    prefs = fields[pref_codes]
+    pref_hit = field_hits(build_field_index(prefs, fields[field_codes]), prefs)
+
+    near = pd.Series(_text_values(students_df, "stu_req")).str.contains("קרוב", regex=False).to_numpy(dtype=bool)
+    return ScoreEncoding(stu_city=stu_city, site_city=site_city,
+                         stu_pref=stu_pref, site_field=site_field, pref_hit=pref_hit, near=near)
+
+# ====== חישוב בבלוקים תחת תקרת זיכרון ======
+# הציון הכולל הוא שלם 0..100 ונשמר כ-uint8; הרכיבים – uint8 כשהמשקלות מאפשרים (אחרת int16).
+# כל חישוב N×M רץ בבלוקים של שורות כך שהזיכרון הזמני של בלוק לא עובר את SCORE_MEMORY_BYTES.
+SCORE_MEMORY_BYTES = int(os.environ.get("PLACEMENT_SCORE_MEMORY_MB", "256")) * 1024 * 1024
+# מעל גודל זה (סוגי סטודנטים × אתרים) השיבוץ החמדני עובד מרשימות מועמדים דלילות
+SPARSE_MIN_CELLS = int(os.environ.get("PLACEMENT_SPARSE_MIN_CELLS", str(50_000_000)))
+_CELL_BYTES = 16   # זיכרון זמני לתא: שלושה רכיבים int16, סכום ומסכות
+
+def _points(W: Weights) -> Tuple[int, int, int, int, int, int]:
+    # אותו עיגול כמו ב-compute_score_with_explain (round של פייתון, לכל רכיב בנפרד)
+    return (round(W.w_field*90.0), round(W.w_field*60.0), round(W.w_city*100.0), round(W.w_city*65.0),
+            round(W.w_special*90.0), round(W.w_special*70.0))
+
+def score_dtype(W: Weights) -> np.dtype:
+    pts = _points(W)
+    return np.dtype(np.uint8 if min(pts) >= 0 and max(pts) <= 255 else np.int16)
+
+def block_rows(m: int, memory_bytes: int = SCORE_MEMORY_BYTES) -> int:
+    # כמה שורות נכנסות בבלוק אחד של חישוב ציונים מול m אתרים
+    return max(1, memory_bytes // max(1, m * _CELL_BYTES))
+
+def score_components(enc: ScoreEncoding, W: Weights, rows: np.ndarray, cols: np.ndarray):
+    # רכיבי הציון עם broadcasting: rows/cols באותה צורה → זוגות; rows[:,None], cols[None,:] → מטריצה
+    same_city = (enc.stu_city[rows] == enc.site_city[cols]) & (enc.stu_city[rows] >= 0)
+    field_hit = enc.pref_hit[enc.stu_pref[rows], enc.site_field[cols]]
+    special_hit = enc.near[rows] & same_city
+    f_hi, f_lo, c_hi, c_lo, s_hi, s_lo = (np.int16(v) for v in _points(W))
+    field   = np.where(field_hit,   f_hi, f_lo)
+    city    = np.where(same_city,   c_hi, c_lo)
+    special = np.where(special_hit, s_hi, s_lo)
+    return field, city, special
+
+def total_score(f: np.ndarray, c: np.ndarray, sp: np.ndarray) -> np.ndarray:
+    return np.clip(f + c + sp, 0, 100).astype(np.uint8)
+
+def student_types(enc: ScoreEncoding) -> np.ndarray:
+    # סטודנטים מאותו "סוג" (עיר, תחום מועדף, בקשת קרבה) מקבלים שורת ציונים זהה
+    return (pd.DataFrame({"city": enc.stu_city, "pref": enc.stu_pref, "near": enc.near})
+            .groupby(["city", "pref", "near"], sort=False).ngroup().to_numpy())
+
+def type_representatives(enc: ScoreEncoding) -> Tuple[np.ndarray, np.ndarray]:
+    # (סוג לכל סטודנט, סטודנט נציג לכל סוג)
+    stu_type = student_types(enc)
+    _, rep = np.unique(stu_type, return_index=True)
+    return stu_type, rep
+
+def build_score_matrix(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights,
+                       enc: Optional[ScoreEncoding] = None, rows: Optional[np.ndarray] = None,
+                       memory_bytes: int = SCORE_MEMORY_BYTES) -> ScoreMatrix:
+    # rows: שורות הקידוד שנכנסות למטריצה (ברירת מחדל: כל הסטודנטים)
+    enc = enc or encode_scoring(students_df, sites_df)
+    rows = np.arange(len(enc.near)) if rows is None else np.asarray(rows)
+    n, m = len(rows), len(enc.site_city)
+    dt = score_dtype(W)
+    field, city, special = (np.empty((n, m), dtype=dt) for _ in range(3))
+    total = np.empty((n, m), dtype=np.uint8)
+    cols = np.arange(m)[None, :]
+    step = block_rows(m, memory_bytes)
+    for r0 in range(0, n, step):
+        f, c, sp = score_components(enc, W, rows[r0:r0 + step, None], cols)
+        field[r0:r0 + step], city[r0:r0 + step], special[r0:r0 + step] = f, c, sp
+        total[r0:r0 + step] = total_score(f, c, sp)
+    return ScoreMatrix(field=field, city=city, special=special, total=total)
+
+def type_score_table(enc: ScoreEncoding, W: Weights, memory_bytes: int = SCORE_MEMORY_BYTES):
+    # הציון הכולל לכל סוג סטודנט × אתר (uint8) + הסוג של כל סטודנט: total[i] == table[stu_type[i]]
+    stu_type, rep = type_representatives(enc)
+    return stu_type, build_score_matrix(None, None, W, enc=enc, rows=rep, memory_bytes=memory_bytes).total
+
+class LazyScoreRows:
+    # שורות ציון כולל שמחושבות מהקידוד רק כשמבקשים אותן (עם מטמון קטן) – במקום מטריצה צפופה
+    def __init__(self, enc: ScoreEncoding, W: Weights, rows: np.ndarray, cache_size: int = 256):
+        self.shape = (len(rows), len(enc.site_city))
+        cols = np.arange(self.shape[1])
+        self._row = lru_cache(maxsize=cache_size)(
+            lambda r: total_score(*score_components(enc, W, np.full(len(cols), rows[r]), cols)))
+
+    def __getitem__(self, r: int) -> np.ndarray:
+        return self._row(int(r))
+
+@dataclass
+class ScoreCandidates:
+    # רשימות מועמדים דלילות (CSR): לכל שורה – האתרים עם ציון ≥ סף, לפי ציון יורד ואז סדר הקובץ
+    indptr: np.ndarray
+    sites: np.ndarray
+    scores: np.ndarray
+
+    def row(self, r: int) -> np.ndarray:
+        return self.sites[self.indptr[r]:self.indptr[r + 1]]
+
+def base_score(W: Weights) -> int:
+    # הציון של זוג בלי שום התאמה (תחום/עיר/קרבה)
+    _, f_lo, _, c_lo, _, s_lo = _points(W)
+    return int(np.clip(f_lo + c_lo + s_lo, 0, 100))
+
+def score_candidates(enc: ScoreEncoding, W: Weights, rows: np.ndarray, min_score: Optional[int] = None,
+                     memory_bytes: int = SCORE_MEMORY_BYTES) -> ScoreCandidates:
+    # min_score: ברירת מחדל – כל אתר שהציון שלו מעל ציון הבסיס (יש לפחות התאמה אחת)
+    min_score = base_score(W) + 1 if min_score is None else min_score
+    m = len(enc.site_city)
+    cols = np.arange(m)[None, :]
+    step = block_rows(m, memory_bytes)
+    counts, sites, scores = [], [], []
+    for r0 in range(0, len(rows), step):
+        total = total_score(*score_components(enc, W, rows[r0:r0 + step, None], cols))
+        rr, jj = np.nonzero(total >= min_score)
+        sc = total[rr, jj]
+        order = np.lexsort((jj, -sc.astype(np.int16), rr))
+        counts.append(np.bincount(rr, minlength=len(total)))
+        sites.append(jj[order].astype(np.int32))
+        scores.append(sc[order])
+    counts = np.concatenate(counts) if counts else np.zeros(0, dtype=np.int64)
+    return ScoreCandidates(indptr=np.concatenate([[0], np.cumsum(counts)]),
+                           sites=np.concatenate(sites) if sites else np.zeros(0, dtype=np.int32),
+                           scores=np.concatenate(scores) if scores else np.zeros(0, dtype=np.uint8))
+
+# ====== k האתרים הטובים לכל סטודנט ======
+def top_k_sites(enc: ScoreEncoding, W: Weights, k: int, exclude: Optional[np.ndarray] = None,
+                feasible: Optional[np.ndarray] = None, memory_bytes: int = SCORE_MEMORY_BYTES):
+    # לכל סטודנט k האתרים עם הציון הגבוה ביותר (בשוויון – המוקדם בקובץ), מתוך feasible (מסכה לאתרים)
+    # ובלי האתר exclude[i] (השיבוץ הנוכחי, -1 = אין). הציון תלוי רק בסוג הסטודנט, ולכן החישוב רץ על
+    # נציג לכל סוג, בבלוקים של שורות: argpartition בוחר את המועמדים בלי מיון מלא, ורק הם ממוינים.
+    # מחזיר (אינדקסי אתרים, ציונים) בצורת N×k; -1 / 0 כשאין מספיק אתרים
+    n, m = len(enc.near), len(enc.site_city)
+    k = max(0, min(int(k), m))
+    idx = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.uint8)
+    if not n or not k:
+        return idx, scores
+    stu_type, type_rep = type_representatives(enc)
+    kk = min(k + (exclude is not None), m)     # מועמד/ת אחד/ת נוסף/ת במקום האתר שיוצא
+    cols = np.arange(m)
+    tie = (m - 1 - cols).astype(np.int64)      # מפתח ייחודי: ציון * m + (מוקדם בקובץ = גבוה)
+    t_idx = np.empty((len(type_rep), kk), dtype=np.int64)
+    t_key = np.empty((len(type_rep), kk), dtype=np.int64)
+    block = block_rows(m, memory_bytes)
+    for t0 in range(0, len(type_rep), block):
+        rows = type_rep[t0:t0 + block]
+        f, c, sp = score_components(enc, W, rows[:, None], cols[None, :])
+        key = total_score(f, c, sp) * np.int64(m) + tie
+        if feasible is not None:
+            key[:, ~feasible] = -1
+        part = np.argpartition(-key, kk - 1, axis=1)[:, :kk]
+        top = np.take_along_axis(key, part, axis=1)
+        order = np.argsort(-top, axis=1)
+        t_idx[t0:t0 + block] = np.take_along_axis(part, order, axis=1)
+        t_key[t0:t0 + block] = np.take_along_axis(top, order, axis=1)
+
+    cand, key = t_idx[stu_type], t_key[stu_type]
+    if exclude is not None:
+        # האתר הנוכחי יוצא מהרשימה; מי שהאתר שלו/ה לא ברשימה מוותר/ת על המועמד/ת הנוסף/ת
+        drop = cand == np.asarray(exclude)[:, None]
+        if kk > k:
+            drop[~drop.any(axis=1), -1] = True
+        keep = np.argsort(drop, axis=1, kind="stable")[:, :k]
+        cand, key = np.take_along_axis(cand, keep, axis=1), np.take_along_axis(key, keep, axis=1)
+        key = np.where(np.take_along_axis(drop, keep, axis=1), -1, key)
+    ok = key >= 0
+    idx[:] = np.where(ok, cand, -1)
+    scores[:] = np.where(ok, key // m, 0)
+    return idx, scores
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# אחסון קומפקטי של טבלאות לכל סשן: dtypes קטנים, תקציב זיכרון, וטבלאות גדולות נשפכות
+# לקובץ Arrow בדיסק ונקראות בחזרה (פעם אחת לכל rerun) רק כשקוד שצריך אותן מבקש
+import os
+import tempfile
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, MutableMapping, Optional
+
+import pandas as pd
+
+from .ingest import _pyarrow_available
+
+SPILL_DIR = os.environ.get("PLACEMENT_SPILL_DIR") or os.path.join(tempfile.gettempdir(), "placement_spill")
+SESSION_BUDGET_BYTES = int(os.environ.get("PLACEMENT_SESSION_BUDGET_MB", "64")) * 1024 * 1024
+CATEGORY_MAX_RATIO = 0.5   # עמודת טקסט עם פחות מחצי ערכים ייחודיים → category
+
+# ----- dtypes קומפקטיים -----
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # טקסט חוזר → category, טקסט ייחודי → string[pyarrow], מספרים שלמים → הטיפוס הקטן ביותר
+    out = df.copy(deep=False)
+    text = "string[pyarrow]" if _pyarrow_available() else None
+    for col in out.columns:
+        s = out[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+        if pd.api.types.is_integer_dtype(s.dtype) and not pd.api.types.is_extension_array_dtype(s.dtype):
+            out[col] = pd.to_numeric(s, downcast="unsigned" if len(s) and s.min() >= 0 else "integer")
+        elif s.dtype == object or pd.api.types.is_string_dtype(s.dtype):
+            if s.dtype == object and pd.api.types.infer_dtype(s, skipna=True) not in ("string", "empty"):
+                continue  # עמודה מעורבת (רשימות, מילונים) – נשארת כמו שהיא
+            if len(s) and s.nunique(dropna=False) <= CATEGORY_MAX_RATIO * len(s):
+                out[col] = s.astype("category")
+            elif text:
+                out[col] = s.astype(text)
+    return out
+
+def frame_nbytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(deep=True, index=True).sum())
+
+# ----- השפכה לדיסק -----
+@dataclass
+class SpilledFrame:
+    path: str
+    rows: int
+    nbytes: int        # גודל הטבלה בזיכרון לפני ההשפכה
+    disk_bytes: int
+
+    def load(self) -> pd.DataFrame:
+        # to_pandas מעתיק ממילא; ה-memory-map רק חוסך עותק Arrow נוסף בזיכרון בזמן ההמרה
+        import pyarrow as pa
+        with pa.memory_map(self.path) as source:
+            return arrow_to_pandas(pa.ipc.open_file(source).read_all())
+
+def arrow_to_pandas(table) -> pd.DataFrame:
+    # טקסט חוזר כ-string[pyarrow] (כמו ב-compact_frame) ולא כ-string[python]
+    import pyarrow as pa
+    text = {pa.string(): pd.StringDtype("pyarrow"), pa.large_string(): pd.StringDtype("pyarrow")}
+    return table.to_pandas(types_mapper=text.get)
+
+def spill_frame(df: pd.DataFrame, spill_dir: str = SPILL_DIR) -> SpilledFrame:
+    import pyarrow as pa
+    os.makedirs(spill_dir, exist_ok=True)
+    path = os.path.join(spill_dir, f"{uuid.uuid4().hex}.arrow")
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    return SpilledFrame(path=path, rows=len(df), nbytes=frame_nbytes(df), disk_bytes=os.path.getsize(path))
+
+def purge_spills(max_age_seconds: float, spill_dir: str = SPILL_DIR) -> int:
+    # מחיקת קבצים של סשנים שכבר נסגרו
+    if not os.path.isdir(spill_dir):
+        return 0
+    cutoff, removed = time.time() - max_age_seconds, 0
+    for name in os.listdir(spill_dir):
+        path = os.path.join(spill_dir, name)
+        if name.endswith(".arrow") and os.path.getmtime(path) < cutoff:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+# ----- מחסן הטבלאות של הסשן -----
+class FrameStore:
+    # state: מילון הסשן (st.session_state או dict רגיל). כל טבלה נשמרת תחת המפתח שלה,
+    # כ-DataFrame קומפקטי או כ-SpilledFrame. כשסך הזיכרון עובר את התקציב – הטבלה הגדולה
+    # ביותר שבזיכרון נשפכת לדיסק (כשאין pyarrow – הכול נשאר בזיכרון).
+    # המחסן נבנה מחדש בכל rerun: טבלה שנשפכה נקראת מהדיסק לכל היותר פעם אחת ב-rerun.
+    # עותקים שמחזיקים מטמונים משותפים (cache_data/cache_resource) לא נספרים בתקציב – אי אפשר
+    # לשפוך אותם – אבל נרשמים ב-note_shared ומוצגים ב-usage.
+    INDEX_KEY = "_frame_store_keys"
+    SHARED_KEY = "_frame_store_shared"
+
+    def __init__(self, state: MutableMapping, budget_bytes: int = SESSION_BUDGET_BYTES,
+                 spill_dir: str = SPILL_DIR):
+        self.state = state
+        self.budget_bytes = budget_bytes
+        self.spill_dir = spill_dir
+        if self.INDEX_KEY not in state:
+            state[self.INDEX_KEY] = []
+        if self.SHARED_KEY not in state:
+            state[self.SHARED_KEY] = {}
+        self._loaded: Dict[str, pd.DataFrame] = {}
+
+    @property
+    def keys(self) -> list:
+        return list(self.state[self.INDEX_KEY])
+
+    def put(self, key: str, df: Optional[pd.DataFrame]) -> None:
+        self.drop(key)
+        if df is None:
+            self.state[key] = None
+            return
+        self.state[key] = compact_frame(df)
+        self.state[self.INDEX_KEY] = self.keys + [key]
+        self._enforce_budget()
+
+    def get(self, key: str) -> Optional[pd.DataFrame]:
+        return self._resolve(self.state.get(key))
+
+    def lazy(self, key: str) -> Callable[[], Optional[pd.DataFrame]]:
+        # טעינה נדחית: לפונקציות במטמון (נקראות רק כשאין פגיעה) ולקבצי הורדה שנבנים ב-thread אחר –
+        # הערך נלכד עכשיו, כך שהטעינה לא ניגשת ל-session_state
+        value = self.state.get(key)
+        return lambda: self._resolve(value)
+
+    def rows(self, key: str) -> Optional[int]:
+        # מספר השורות בלי לקרוא טבלה שנשפכה
+        value = self.state.get(key)
+        if isinstance(value, SpilledFrame):
+            return value.rows
+        return len(value) if isinstance(value, pd.DataFrame) else None
+
+    def _resolve(self, value) -> Optional[pd.DataFrame]:
+        # לפי נתיב הקובץ (ייחודי לכל השפכה) ולא לפי המפתח – בלי גישה ל-session_state
+        if not isinstance(value, SpilledFrame):
+            return value
+        loaded = self._loaded.get(value.path)
+        if loaded is None:
+            if not os.path.exists(value.path):
+                return None  # נמחק ב-purge_spills
+            loaded = self._loaded[value.path] = value.load()
+        return loaded
+
+    def note_shared(self, name: str, *dfs: Optional[pd.DataFrame]) -> None:
+        # טבלאות שמוחזקות במטמון משותף (הקובץ המזוהה ב-cache_data, דוחות הריצה ב-cache_resource) –
+        # לתצוגה ב-usage בלבד; בלי טבלאות – הרישום נמחק
+        dfs = [df for df in dfs if isinstance(df, pd.DataFrame)]
+        shared = dict(self.state[self.SHARED_KEY])
+        if dfs:
+            shared[name] = (len(dfs[0]), sum(map(frame_nbytes, dfs)))
+        else:
+            shared.pop(name, None)
+        self.state[self.SHARED_KEY] = shared
+
+    def shared_bytes(self) -> int:
+        return sum(nbytes for _, nbytes in self.state[self.SHARED_KEY].values())
+
+    def drop(self, key: str) -> None:
+        value = self.state.pop(key, None)
+        if isinstance(value, SpilledFrame):
+            self._loaded.pop(value.path, None)
+            try:
+                os.remove(value.path)
+            except OSError:
+                pass
+        if key in self.state[self.INDEX_KEY]:
+            self.state[self.INDEX_KEY] = [k for k in self.keys if k != key]
+
+    def memory_bytes(self) -> int:
+        return sum(frame_nbytes(v) for v in map(self.state.get, self.keys) if isinstance(v, pd.DataFrame))
+
+    def _enforce_budget(self) -> None:
+        if not _pyarrow_available():
+            return
+        in_memory = {k: frame_nbytes(v) for k in self.keys if isinstance(v := self.state.get(k), pd.DataFrame)}
+        total = sum(in_memory.values())
+        for key, size in sorted(in_memory.items(), key=lambda kv: kv[1], reverse=True):
+            if total <= self.budget_bytes:
+                break
+            self.state[key] = spill_frame(self.state[key], self.spill_dir)
+            total -= size
+
+    def usage(self) -> pd.DataFrame:
+        rows = []
+        for key in self.keys:
+            value = self.state.get(key)
+            if isinstance(value, SpilledFrame):
+                rows.append({"טבלה": key, "שורות": value.rows, "זיכרון (MB)": 0.0,
+                             "דיסק (MB)": value.disk_bytes / 2**20, "מיקום": "דיסק"})
+            elif isinstance(value, pd.DataFrame):
+                rows.append({"טבלה": key, "שורות": len(value), "זיכרון (MB)": frame_nbytes(value) / 2**20,
+                             "דיסק (MB)": 0.0, "מיקום": "זיכרון"})
+        for name, (n, nbytes) in self.state[self.SHARED_KEY].items():
+            rows.append({"טבלה": name, "שורות": n, "זיכרון (MB)": nbytes / 2**20, "דיסק (MB)": 0.0,
+                         "מיקום": "מטמון משותף"})
+        return pd.DataFrame(rows, columns=["טבלה", "שורות", "זיכרון (MB)", "דיסק (MB)", "מיקום"]).round(2)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+# ניתוח רגישות למשקלות: אותו מחזור משובץ מחדש לכל צירוף משקלות ברשת, בתהליכים מקבילים.
+# הקידוד (ScoreEncoding, קיבולות, מדריכים) נשלח לכל תהליך פעם אחת ב-initializer,
+# וכל משימה מקבלת רק את המשקלות ומחזירה את מערך השיבוץ – בלי DataFrame-ים בדרך.
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .diagnostics import instrumented
+from .matching import ASSIGNERS, ProgressFn, CancelFn, MatchCancelled
+from .scoring import Weights, ScoreEncoding, encode_scoring, score_components
+
+SWEEP_WORKERS = int(os.environ.get("PLACEMENT_SWEEP_WORKERS", str(os.cpu_count() or 1)))
+
+def weight_grid(step: float = 0.1) -> List[Weights]:
+    # כל הצירופים על הסימפלקס w_field + w_city + w_special = 1 בקפיצות של step
+    k = int(round(1 / step))
+    return [Weights(w_field=round(f * step, 6), w_city=round(c * step, 6), w_special=round((k - f - c) * step, 6))
+            for f, c in itertools.product(range(k + 1), repeat=2) if f + c <= k]
+
+def _point_scores(enc: ScoreEncoding, W: Weights, chosen: np.ndarray) -> np.ndarray:
+    rows = np.flatnonzero(chosen >= 0)
+    scores = np.zeros(len(chosen), dtype=np.int64)
+    f, c, sp = score_components(enc, W, rows, chosen[rows])
+    scores[rows] = np.clip(f + c + sp, 0, 100)
+    return scores
+
+# ----- צד התהליך -----
+_worker: dict = {}
+
+def _init_worker(enc: ScoreEncoding, capacity: np.ndarray, sup_codes: np.ndarray, mode: str, kwargs: dict) -> None:
+    _worker.update(enc=enc, capacity=capacity, sup_codes=sup_codes, assign=ASSIGNERS[mode], kwargs=kwargs)
+
+def _run_point(W: Weights) -> Tuple[np.ndarray, np.ndarray]:
+    enc = _worker["enc"]
+    chosen = _worker["assign"](enc, W, _worker["capacity"], _worker["sup_codes"], **_worker["kwargs"])
+    return chosen.astype(np.int32), _point_scores(enc, W, chosen).astype(np.uint8)
+
+# ----- טבלת ההשוואה -----
+def sweep_table(grid: Sequence[Weights], chosen: np.ndarray, scores: np.ndarray, baseline: int = 0) -> pd.DataFrame:
+    # chosen/scores: מערכים P×N (נקודה × סטודנט); baseline: אינדקס הנקודה שמולה סופרים מעברים
+    matched = chosen >= 0
+    n_matched = matched.sum(axis=1)
+    none = n_matched == 0
+    mean = (scores * matched).sum(axis=1) / np.maximum(n_matched, 1)
+    low = np.where(matched, scores, 255).min(axis=1, initial=255)
+    df = pd.DataFrame([asdict(W) for W in grid]).rename(columns={
+        "w_field": "משקל תחום", "w_city": "משקל עיר", "w_special": "משקל בקשות"})
+    df["אחוז התאמה ממוצע"] = np.where(none, np.nan, np.round(mean, 2))
+    df["אחוז התאמה מינימלי"] = np.where(none, np.nan, low)
+    df["לא שובצו"] = (~matched).sum(axis=1)
+    df["עברו אתר לעומת הבסיס"] = (chosen != chosen[baseline]).sum(axis=1)
+    df["בסיס"] = np.arange(len(grid)) == baseline
+    return df
+
+@instrumented("run_sweep", rows=len)
+def run_sweep(students_df: pd.DataFrame, sites_df: pd.DataFrame, grid: Optional[Sequence[Weights]] = None,
+              mode: str = "greedy", workers: Optional[int] = None, baseline: Optional[Weights] = None,
+              progress: Optional[ProgressFn] = None, cancel: Optional[CancelFn] = None, **kwargs) -> pd.DataFrame:
+    # baseline: המשקלות שמולם נספרים "עברו אתר" (ברירת מחדל: Weights()); נוסף לרשת אם חסר
+    if mode not in ASSIGNERS:
+        raise ValueError(f"שיטת שיבוץ לא מוכרת: {mode}")
+    grid = list(grid if grid is not None else weight_grid())
+    baseline = baseline or Weights()
+    if baseline not in grid:
+        grid.insert(0, baseline)
+    enc = encode_scoring(students_df, sites_df)
+    capacity = sites_df["capacity_left"].to_numpy(dtype=np.int64)
+    sup_codes, _ = pd.factorize(sites_df["שם המדריך"])
+    n = len(students_df)
+    chosen = np.full((len(grid), n), -1, dtype=np.int32)
+    scores = np.zeros((len(grid), n), dtype=np.uint8)
+
+    workers = max(1, min(workers or SWEEP_WORKERS, len(grid)))
+    init_args = (enc, capacity, sup_codes, mode, kwargs)
+    if workers == 1:
+        _init_worker(*init_args)
+        for p, W in enumerate(grid):
+            if cancel is not None and cancel():
+                raise MatchCancelled()
+            chosen[p], scores[p] = _run_point(W)
+            if progress is not None:
+                progress(p + 1, len(grid))
+    else:
+        # spawn ולא fork: שרת Streamlit מריץ threads, ו-fork של תהליך כזה אינו בטוח
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker,
+                                 initargs=init_args) as pool:
+            futures = {pool.submit(_run_point, W): p for p, W in enumerate(grid)}
+            for done, fut in enumerate(as_completed(futures), start=1):
+                if cancel is not None and cancel():
+                    for f in futures:
+                        f.cancel()
+                    raise MatchCancelled()
+                chosen[futures[fut]], scores[futures[fut]] = fut.result()
+                if progress is not None:
+                    progress(done, len(grid))
+    return sweep_table(grid, chosen, scores, baseline=grid.index(baseline))
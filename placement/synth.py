@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# מחולל מחזורים סינתטיים: קבצי סטודנטים ואתרים בעברית, משחזרים (seed), בכל גודל –
+# לבדיקות ביצועים ולהדגמה. שמות העמודות נבחרים מבין הכינויים ב-STU_COLS/SITE_COLS,
+# ויש גם עמודות "רעש" (טלפון, אימייל, רחוב) וטקסט לא נקי כמו בקבצי הרשם האמיתיים.
+import argparse
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .ingest import STU_COLS, SITE_COLS
+
+# ----- מאגרי ערכים -----
+CITIES = ["ירושלים", "תל אביב", "חיפה", "ראשון לציון", "פתח תקווה", "אשדוד", "נתניה", "באר שבע",
+          "בני ברק", "חולון", "רמת גן", "אשקלון", "רחובות", "בת ים", "כפר סבא", "הרצליה",
+          "חדרה", "מודיעין", "נצרת", "לוד", "רמלה", "עכו", "נהריה", "טבריה", "צפת",
+          "קריית שמונה", "אילת", "דימונה", "אום אל-פחם", "רהט", "כרמיאל", "עפולה"]
+# משקל לפי גודל העיר (בערך) – רוב הסטודנטים והאתרים בערים הגדולות
+CITY_WEIGHTS = np.array([10, 9, 7, 6, 6, 5, 5, 5, 4, 4, 4, 3, 3, 3, 3, 2,
+                         2, 2, 2, 2, 2, 1.5, 1.5, 1, 1, 1, 1, 1, 1, 1, 1, 1], dtype=float)
+FIELDS = ["בריאות הנפש", "רווחה", "חינוך מיוחד", "זקנה", "נוער וצעירים", "שיקום",
+          "התמכרויות", "ילדים ומשפחה", "מוגבלויות", "קהילה"]
+SITE_KINDS = {
+    "בריאות הנפש": ["מרכז לבריאות הנפש", "מרפאה פסיכיאטרית", "הוסטל"],
+    "רווחה": ["מחלקה לשירותים חברתיים", "לשכת רווחה"],
+    "חינוך מיוחד": ["בית ספר לחינוך מיוחד", "גן תקשורת"],
+    "זקנה": ["מרכז יום לקשיש", "בית אבות"],
+    "נוער וצעירים": ["מרכז צעירים", "יחידה לקידום נוער"],
+    "שיקום": ["מרכז שיקום", "מרכז תעסוקה שיקומי"],
+    "התמכרויות": ["תחנה לטיפול בהתמכרויות", "קהילה טיפולית"],
+    "ילדים ומשפחה": ["מרכז קשר", "מרכז לשלום המשפחה"],
+    "מוגבלויות": ["מעון יום שיקומי", "מרכז לאנשים עם מוגבלות"],
+    "קהילה": ["מרכז קהילתי", "עמותה קהילתית"],
+}
+FIRST_NAMES = ["נועה", "מאיה", "תמר", "יעל", "שירה", "אביגיל", "רות", "מיכל", "הילה", "אורי",
+               "יונתן", "איתי", "דניאל", "עומר", "נדב", "יואב", "אריאל", "עידו", "מוחמד", "אחמד",
+               "סמאח", "נור", "ראניה", "לילה", "יוסף", "עלי", "אלכסנדר", "אנה", "ולרי", "טל"]
+LAST_NAMES = ["כהן", "לוי", "מזרחי", "פרץ", "ביטון", "דהן", "אברהם", "פרידמן", "אזולאי", "מלכה",
+              "חדד", "גבאי", "שפירא", "אוחיון", "קצב", "ח'ורי", "עבאס", "חביב", "נסאר", "סלאמה",
+              "איבנוב", "קוזלוב", "בן דוד", "שטרן", "רוזן", "גולן", "ברק", "אלון", "שגיא", "נחום"]
+SPECIAL_REQS = ["", "קרוב לבית", "קרוב לתחבורה ציבורית", "נגישות לכיסא גלגלים", "רק ימים א'-ג'", "מעדיפה אתר קטן"]
+SPECIAL_WEIGHTS = np.array([70, 14, 6, 3, 4, 3], dtype=float)
+CAPACITY_WEIGHTS = np.array([35, 35, 18, 8, 4], dtype=float)   # קיבולת 1..5
+
+def _rng(seed) -> np.random.Generator:
+    return seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+
+def _choice(rng: np.random.Generator, values, n: int, weights: Optional[np.ndarray] = None) -> np.ndarray:
+    p = None if weights is None else weights / weights.sum()
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p)]
+
+def _alias(rng: np.random.Generator, options, aliases: bool) -> str:
+    return options[int(rng.integers(len(options)))] if aliases else options[0]
+
+def _messy(rng: np.random.Generator, values: np.ndarray, rate: float) -> np.ndarray:
+    # רווחים כפולים/בקצוות ו-NBSP בחלק מהערכים – מה שהנרמול צריך לנקות
+    out = values.astype(object).copy()
+    hit = np.flatnonzero(rng.random(len(out)) < rate)
+    kind = rng.integers(3, size=len(hit))
+    for i, k in zip(hit, kind):
+        v = str(out[i])
+        out[i] = (" " + v + " ", v.replace(" ", "  "), v.replace(" ", "\u00a0"))[k]
+    return out
+
+def _ids(rng: np.random.Generator, n: int) -> np.ndarray:
+    # תעודות זהות ייחודיות בנות 9 ספרות (ללא ספרת ביקורת אמיתית)
+    return np.char.zfill((rng.choice(390_000_000, size=n, replace=False) + 10_000_000).astype(str), 9)
+
+def make_students(n: int, seed=0, aliases: bool = True, messy: float = 0.05,
+                  multi_pref: float = 0.2) -> pd.DataFrame:
+    # multi_pref: שיעור הסטודנטים עם כמה תחומים מועדפים ("רווחה, זקנה")
+    rng = _rng(seed)
+    city = _choice(rng, CITIES, n, CITY_WEIGHTS)
+    pref = _choice(rng, FIELDS, n)
+    second = _choice(rng, FIELDS, n)
+    sep = _choice(rng, [", ", "; ", " | "], n)
+    multi = (rng.random(n) < multi_pref) & (second != pref)
+    pref = np.where(multi, pref + sep + second, pref)
+    pref = np.where(rng.random(n) < 0.03, "", pref)
+    first, last = _choice(rng, FIRST_NAMES, n), _choice(rng, LAST_NAMES, n)
+    cols = {
+        _alias(rng, STU_COLS["first"], aliases): first,
+        _alias(rng, STU_COLS["last"], aliases): last,
+        _alias(rng, STU_COLS["id"], aliases): _ids(rng, n),
+        _alias(rng, STU_COLS["city"], aliases): _messy(rng, city, messy),
+        _alias(rng, STU_COLS["phone"], aliases): np.char.add("05", rng.integers(10_000_000, 99_999_999, n).astype(str)),
+        _alias(rng, STU_COLS["email"], aliases): np.char.add(np.char.add("student", np.arange(n).astype(str)), "@example.ac.il"),
+        _alias(rng, STU_COLS["preferred_field"], aliases): _messy(rng, pref, messy),
+        _alias(rng, STU_COLS["special_req"], aliases): _choice(rng, SPECIAL_REQS, n, SPECIAL_WEIGHTS),
+    }
+    return pd.DataFrame(cols)
+
+def make_sites(m: int, seed=0, aliases: bool = True, messy: float = 0.05,
+               sites_per_supervisor: float = 1.5) -> pd.DataFrame:
+    rng = _rng(seed)
+    field = _choice(rng, FIELDS, m)
+    city = _choice(rng, CITIES, m, CITY_WEIGHTS)
+    kind = np.array([SITE_KINDS[f][int(k)] for f, k in zip(field, rng.integers(0, 2, m))], dtype=object)
+    name = kind + " " + city + " " + (np.arange(m) + 1).astype(str).astype(object)
+    # חלק מהמדריכים אחראים על כמה אתרים; מעט אתרים בלי מדריך רשום
+    n_sup = max(1, int(round(m / sites_per_supervisor)))
+    sup = rng.integers(n_sup, size=m)
+    combos = len(FIRST_NAMES) * len(LAST_NAMES)
+    sup_first = np.asarray(FIRST_NAMES, dtype=object)[sup % len(FIRST_NAMES)]
+    sup_last = np.asarray(LAST_NAMES, dtype=object)[(sup // len(FIRST_NAMES)) % len(LAST_NAMES)]
+    # מעבר למספר הצירופים – מספור, כדי שכל מדריך/ה יישאר/תישאר ייחודי/ת
+    sup_last = np.where(sup >= combos, sup_last + " " + (sup // combos).astype(str).astype(object), sup_last)
+    no_sup = rng.random(m) < 0.02
+    capacity = rng.choice(np.arange(1, 6), size=m, p=CAPACITY_WEIGHTS / CAPACITY_WEIGHTS.sum())
+    cols = {
+        _alias(rng, SITE_COLS["name"], aliases): name,
+        _alias(rng, SITE_COLS["field"], aliases): _messy(rng, field, messy),
+        "רחוב": _choice(rng, ["הרצל", "ויצמן", "בן גוריון", "הנביאים", "העצמאות", "יפו"], m),
+        _alias(rng, SITE_COLS["city"], aliases): _messy(rng, city, messy),
+        _alias(rng, SITE_COLS["capacity"], aliases): capacity,
+        "שם פרטי": np.where(no_sup, "", sup_first),
+        "שם משפחה": np.where(no_sup, "", sup_last),
+        _alias(rng, SITE_COLS["phone"], aliases): np.char.add("0", rng.integers(20_000_000, 99_999_999, m).astype(str)),
+        _alias(rng, SITE_COLS["review"], aliases): _choice(rng, ["", "", "מדריך/ה מצוין/ת", "זקוק/ה לליווי"], m),
+    }
+    return pd.DataFrame(cols)
+
+def make_cohort(students: int, sites: int, seed: int = 0, aliases: bool = True,
+                messy: float = 0.05) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # שני זרמים נפרדים מאותו seed – שינוי מספר האתרים לא משנה את קובץ הסטודנטים
+    stu_seed, site_seed = np.random.SeedSequence(seed).spawn(2)
+    return (make_students(students, np.random.default_rng(stu_seed), aliases, messy),
+            make_sites(sites, np.random.default_rng(site_seed), aliases, messy))
+
+def write_cohort(students_df: pd.DataFrame, sites_df: pd.DataFrame, out_dir: Path,
+                 fmt: str = "csv") -> Tuple[Path, Path]:
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = out_dir / f"students.{fmt}", out_dir / f"sites.{fmt}"
+    for df, path in zip((students_df, sites_df), paths):
+        if fmt == "csv":
+            df.to_csv(path, index=False, encoding="utf-8-sig")
+        elif fmt == "xlsx":
+            df.to_excel(path, index=False, engine="xlsxwriter")
+        else:
+            raise ValueError(f"פורמט לא נתמך: {fmt}")
+    return paths
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(prog="python -m placement.synth", description="מחזור סינתטי: קבצי סטודנטים ואתרים")
+    p.add_argument("--students", type=int, default=1000)
+    p.add_argument("--sites", type=int, default=100)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--format", choices=["csv", "xlsx"], default="csv")
+    p.add_argument("--canonical", action="store_true", help="שמות עמודות קבועים (בלי כינויים)")
+    p.add_argument("-o", "--out-dir", type=Path, default=Path("."))
+    args = p.parse_args(argv)
+    students_df, sites_df = make_cohort(args.students, args.sites, args.seed, aliases=not args.canonical)
+    paths = write_cohort(students_df, sites_df, args.out_dir, args.format)
+    print(" ".join(str(x) for x in paths))
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,11 +1,25 @@
 # matcher_streamlit_beauty_rtl_v7_fixed.py 
 # -*- coding: utf-8 -*-
+import contextvars
+import hashlib
+import json
+import re
+from dataclasses import asdict, replace
+import uuid
+from functools import partial
+from io import BytesIO
+from typing import Tuple
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-import numpy as np
-from io import BytesIO
-from dataclasses import dataclass
-from typing import Optional, Any, List
+
+from placement import (Weights, MatchCancelled, submit_match, submit_sweep, weight_grid, STUDENT_FIELDS, SITE_FIELDS, SITE_RANK_KEYS, DEFAULT_SITE_RANK, ALL_TEACHERS,
+                       FrameStore, compact_frame, purge_spills, read_any, resolve_students, resolve_sites, share_categories, df_to_xlsx_bytes, workbook_bytes, report_sheets,
+                       RunReports, build_reports, score_breakdown,
+                       DEFAULT_ALTERNATIVES, alternatives_table,
+                       CohortDiff, rematch, RunStore, new_run_id, diff_runs,
+                       TRACE_MEMORY, Diagnostics, set_diagnostics, enable_json_log)
 
 # =========================
 # קונפיגורציה כללית
@@ -95,126 +109,16 @@ label,.stMarkdown,.stText,.stCaption{ text-align:right!important; }
 st.markdown("<h1>מערכת שיבוץ סטודנטים – התאמה חכמה</h1>", unsafe_allow_html=True)
 st.markdown("<p style='text-align:center;color:#475569;margin-top:-8px;'>כאן משבצים סטודנטים למקומות התמחות בקלות, בהתבסס על תחום, עיר ובקשות.</p>", unsafe_allow_html=True)
 
-# ====== מודל ניקוד ======
-@dataclass
-class Weights:
-    w_field: float = 0.50
-    w_city: float = 0.05
-    w_special: float = 0.45
-
-# עמודות סטודנטים
-STU_COLS = {
-    "id": ["מספר תעודת זהות", "תעודת זהות", "ת\"ז", "תז", "תעודת זהות הסטודנט"],
-    "first": ["שם פרטי"],
-    "last": ["שם משפחה"],
-    "address": ["כתובת", "כתובת הסטודנט", "רחוב"],
-    "city": ["עיר מגורים", "עיר"],
-    "phone": ["טלפון", "מספר טלפון"],
-    "email": ["דוא\"ל", "דוא״ל", "אימייל", "כתובת אימייל", "כתובת מייל"],
-    "preferred_field": ["תחום מועדף","תחומים מועדפים"],
-    "special_req": ["בקשה מיוחדת"],
-    "partner": ["בן/בת זוג להכשרה", "בן\\בת זוג להכשרה", "בן/בת זוג", "בן\\בת זוג"]
-}
-
-# עמודות אתרים
-SITE_COLS = {
-    "name": ["מוסד / שירות הכשרה", "מוסד", "שם מוסד ההתמחות", "שם המוסד", "מוסד ההכשרה"],
-    "field": ["תחום ההתמחות", "תחום התמחות"],
-    "street": ["רחוב"],
-    "city": ["עיר"],
-    "capacity": ["מספר סטודנטים שניתן לקלוט השנה", "מספר סטודנטים שניתן לקלוט", "קיבולת"],
-    "sup_first": ["שם פרטי"],
-    "sup_last": ["שם משפחה"],
-    "phone": ["טלפון"],
-    "email": ["אימייל", "כתובת מייל", "דוא\"ל", "דוא״ל"],
-    "review": ["חוות דעת מדריך"]
-}
-
-def pick_col(df: pd.DataFrame, options: List[str]) -> Optional[str]:
-    for opt in options:
-        if opt in df.columns: return opt
-    return None
-
-# ----- קריאת קבצים -----
-def read_any(uploaded) -> pd.DataFrame:
-    name = (uploaded.name or "").lower()
-    if name.endswith(".csv"):
-        return pd.read_csv(uploaded, encoding="utf-8-sig")
-    if name.endswith((".xlsx",".xls")):
-        return pd.read_excel(uploaded)
-    return pd.read_csv(uploaded, encoding="utf-8-sig")
-
-def normalize_text(x: Any) -> str:
-    if x is None: return ""
-    return str(x).strip()
-
-# ----- סטודנטים -----
-def resolve_students(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["stu_id"] = out[pick_col(out, STU_COLS["id"])]
-    out["stu_first"] = out[pick_col(out, STU_COLS["first"])]
-    out["stu_last"]  = out[pick_col(out, STU_COLS["last"])]
-    out["stu_city"]  = out[pick_col(out, STU_COLS["city"])] if pick_col(out, STU_COLS["city"]) else ""
-    out["stu_pref"]  = out[pick_col(out, STU_COLS["preferred_field"])] if pick_col(out, STU_COLS["preferred_field"]) else ""
-    out["stu_req"]   = out[pick_col(out, STU_COLS["special_req"])] if pick_col(out, STU_COLS["special_req"]) else ""
-    for c in ["stu_id","stu_first","stu_last","stu_city","stu_pref","stu_req"]:
-        out[c] = out[c].apply(normalize_text)
-    return out
-
-# ----- אתרים -----
-def resolve_sites(df: pd.DataFrame) -> pd.DataFrame:
-    out = df.copy()
-    out["site_name"]  = out[pick_col(out, SITE_COLS["name"])]
-    out["site_field"] = out[pick_col(out, SITE_COLS["field"])]
-    out["site_city"]  = out[pick_col(out, SITE_COLS["city"])]
-    cap_col = pick_col(out, SITE_COLS["capacity"])
-    out["site_capacity"] = pd.to_numeric(out[cap_col], errors="coerce").fillna(1).astype(int) if cap_col else 1
-    out["capacity_left"] = out["site_capacity"].astype(int)
-    sup_first = pick_col(out, SITE_COLS["sup_first"])
-    sup_last  = pick_col(out, SITE_COLS["sup_last"])
-    out["שם המדריך"] = ""
-    if sup_first or sup_last:
-        ff = out[sup_first] if sup_first else ""
-        ll = out[sup_last]  if sup_last else ""
-        out["שם המדריך"] = (ff.astype(str) + " " + ll.astype(str)).str.strip()
-    for c in ["site_name","site_field","site_city","שם המדריך"]:
-        out[c] = out[c].apply(normalize_text)
-    return out
-
-# ====== חישוב ציון ======
-def compute_score(stu: pd.Series, site: pd.Series, W: Weights) -> float:
-    same_city = (stu.get("stu_city") and site.get("site_city") and stu.get("stu_city") == site.get("site_city"))
-    field_s   = 90.0 if stu.get("stu_pref") and stu.get("stu_pref") in site.get("site_field","") else 60.0
-    city_s    = 100.0 if same_city else 65.0
-    special_s = 90.0 if "קרוב" in stu.get("stu_req","") and same_city else 70.0
-    score = W.w_field*field_s + W.w_city*city_s + W.w_special*special_s
-    return float(np.clip(score, 0, 100))
-
-# --- גרסה עם פירוט מרכיבים (לשבירת הציון) ---
-def compute_score_with_explain(stu: pd.Series, site: pd.Series, W: Weights):
-    same_city = (stu.get("stu_city") and site.get("site_city") and stu.get("stu_city") == site.get("site_city"))
-    field_s   = 90.0 if stu.get("stu_pref") and stu.get("stu_pref") in site.get("site_field","") else 60.0
-    city_s    = 100.0 if same_city else 65.0
-    special_s = 90.0 if "קרוב" in stu.get("stu_req","") and same_city else 70.0
-
-    parts = {
-        "התאמת תחום": round(W.w_field*field_s),
-        "מרחק/גיאוגרפיה": round(W.w_city*city_s),
-        "בקשות מיוחדות": round(W.w_special*special_s),
-        "עדיפויות הסטודנט/ית": 0  # אין קלט דירוג מפורש בקובץ זה; נשאר 0 לשקיפות
-    }
-    score = int(np.clip(sum(parts.values()), 0, 100))
-    return score, parts
-
 # =========================
 # 1) הוראות שימוש
 # =========================
 st.markdown("## 📘 הוראות שימוש")
-st.markdown("""
+st.markdown(f"""
 1. **קובץ סטודנטים (CSV/XLSX):** שם פרטי, שם משפחה, תעודת זהות, כתובת/עיר, טלפון, אימייל.  
-   אופציונלי: תחום מועדף, בקשה מיוחדת, בן/בת זוג להכשרה.  
+   אופציונלי: תחום מועדף (אפשר כמה, מופרדים בפסיק), בקשה מיוחדת, בן/בת זוג להכשרה.  
 2. **קובץ אתרים/מדריכים (CSV/XLSX):** מוסד/שירות, תחום התמחות, רחוב, עיר, מספר סטודנטים שניתן לקלוט השנה, מדריך, חוות דעת מדריך.  
-3. **בצע שיבוץ** מחשב *אחוז התאמה* לפי תחום (50%), בקשות מיוחדות (45%), עיר (5%). 
+3. **בצע שיבוץ** מחשב *אחוז התאמה* לפי תחום (50%), בקשות מיוחדות (45%), עיר (5%). אפשר לבחור שיבוץ חמדני (לפי סדר הקובץ), אופטימלי (מקסימום התאמה כוללת) או יציב (הצעות סטודנטים – Deferred Acceptance: אין סטודנט/ית ואתר שמעדיפים זה את זה על פני השיבוץ שקיבלו).  
+   בשיבוץ היציב בוחרים גם איך האתרים מדרגים סטודנטים, לפי סדר החשיבות, מתוך: {", ".join(SITE_RANK_KEYS.values())} (ברירת מחדל: {", ".join(SITE_RANK_KEYS[k] for k in DEFAULT_SITE_RANK)}; שוויון נשבר לפי סדר הקובץ). 
 4. בסוף אפשר להוריד **XLSX**. 
 """)
 
@@ -244,14 +148,75 @@ with colY:
 # 3) העלאת קבצים
 # =========================
 st.markdown("## 📤 העלאת קבצים")
+
+# ====== מטמון לפי תוכן הקובץ ======
+# כל אינטראקציה מריצה את הסקריפט מחדש; קבצים זהים (לפי hash של התוכן) לא נקראים ולא מפוענחים שוב.
+# המטמון משותף לכל הסשנים, מוגבל בגודל (LRU) ובזמן (TTL).
+CACHE_MAX_ENTRIES = 8
+CACHE_TTL_SECONDS = 60 * 60
+
+def upload_digest(uploaded, kind: str) -> str:
+    # ה-hash מחושב פעם אחת לכל העלאה (file_id), לא בכל rerun
+    file_id = getattr(uploaded, "file_id", None)
+    seen = st.session_state.get(f"_{kind}_upload")
+    if file_id is not None and seen and seen[0] == file_id:
+        return seen[1]
+    digest = hashlib.sha256(uploaded.getvalue()).hexdigest()
+    st.session_state[f"_{kind}_upload"] = (file_id, digest)
+    return digest
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, ttl=CACHE_TTL_SECONDS, show_spinner="קורא את הקובץ…")
+def load_table(digest: str, name: str, kind: str, _data: bytes) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    # נקראות רק העמודות שהשיבוץ צריך (לפי מפת הכינויים של סוג הקובץ). במטמון נשמרים רק
+    # חמש שורות לתצוגה והטבלה המזוהה בטיפוסים קומפקטיים – לא הקובץ הגולמי
+    buf = BytesIO(_data)
+    buf.name = name
+    raw = read_any(buf, STUDENT_FIELDS if kind == "students" else SITE_FIELDS)
+    resolved = resolve_students(raw) if kind == "students" else resolve_sites(raw)
+    return raw.head(5), compact_frame(resolved)
+
+# ====== מחסן הטבלאות של הסשן ======
+# בסשן נשמרות רק הטבלאות המזוהות (stu_*/site_*) בטיפוסים קומפקטיים, ולא הקובץ המקורי;
+# מעבר לתקציב הזיכרון של הסשן – הטבלאות הגדולות נשפכות לקובץ Arrow בדיסק.
+frames = FrameStore(st.session_state)
+if not st.session_state.get("_spills_purged"):
+    purge_spills(24 * CACHE_TTL_SECONDS)  # קבצים של סשנים שנסגרו
+    st.session_state["_spills_purged"] = True
+
+# ====== אבחון ביצועים ======
+# כל שלב בצינור (קריאה, זיהוי, שיבוץ, דוחות, XLSX) נמדד לתוך ה-Diagnostics של הסשן ונכתב
+# כשורת JSON ל-stderr של השרת; רשומות השיבוץ והדוחות מתויגות במזהה הריצה.
+enable_json_log()
+diag = st.session_state.setdefault("diagnostics", Diagnostics())
+# שיא ההקצאות (tracemalloc) מאט את כל התהליך – רק כשהמתג בפאנל האבחון דולק
+diag.trace_memory = st.session_state.get("diag_trace_memory", TRACE_MEMORY)
+set_diagnostics(diag)
+
+def in_context(fn):
+    # קבצי הורדה (data כ-callable) נבנים ב-thread של השרת ולא של הסקריפט – ההקשר, ובו האבחון, עובר איתם
+    ctx = contextvars.copy_context()
+    return lambda: ctx.run(fn)
+
+def load_upload(uploaded, kind: str) -> None:
+    # טוען לסשן רק כשהתוכן השתנה; אחרת אין קריאה ואין העתקה
+    digest = upload_digest(uploaded, kind)
+    if st.session_state.get(f"{kind}_digest") != digest:
+        diag.run_id = ""  # קליטת קבצים – לפני שיש ריצה
+        preview, resolved = load_table(digest, uploaded.name, kind, uploaded.getvalue())
+        frames.put(f"df_{kind}", resolved)
+        # עותק נוסף של אותה טבלה נשאר במטמון (משותף לסשנים) – נספר בפאנל הזיכרון
+        frames.note_shared(f"מטמון קובץ ה{'סטודנטים' if kind == 'students' else 'אתרים'}", resolved)
+        st.session_state[f"{kind}_preview"] = preview
+        st.session_state[f"{kind}_digest"] = digest
+
 colA, colB = st.columns(2, gap="large")
 
 with colA:
     students_file = st.file_uploader("קובץ סטודנטים", type=["csv","xlsx","xls"], key="students_file")
     if students_file is not None:
         try:
-            st.session_state["df_students_raw"] = read_any(students_file)
-            st.dataframe(st.session_state["df_students_raw"].head(5), use_container_width=True)
+            load_upload(students_file, "students")
+            st.dataframe(st.session_state["students_preview"], use_container_width=True)
         except Exception as e:
             st.error(f"לא ניתן לקרוא את קובץ הסטודנטים: {e}")
 
@@ -259,115 +224,44 @@ with colB:
     sites_file = st.file_uploader("קובץ אתרי התמחות/מדריכים", type=["csv","xlsx","xls"], key="sites_file")
     if sites_file is not None:
         try:
-            st.session_state["df_sites_raw"] = read_any(sites_file)
-            st.dataframe(st.session_state["df_sites_raw"].head(5), use_container_width=True)
+            load_upload(sites_file, "sites")
+            st.dataframe(st.session_state["sites_preview"], use_container_width=True)
         except Exception as e:
             st.error(f"לא ניתן לקרוא את קובץ האתרים/מדריכים: {e}")
 
-for k in ["df_students_raw","df_sites_raw","result_df","unmatched_students","unused_sites"]:
+for k in ["df_students","df_sites","students_digest","sites_digest","result_df","unmatched_students","unused_sites"]:
     st.session_state.setdefault(k, None)
 
-# ====== שיבוץ ======
-def greedy_match(students_df: pd.DataFrame, sites_df: pd.DataFrame, W: Weights) -> pd.DataFrame:
-    results = []
-    supervisor_count = {}  # מונים פר-מדריך (דוגמה: עד 2 סטודנטים לכל מדריך)
-
-    for _, s in students_df.iterrows():
-        cand = sites_df[sites_df["capacity_left"] > 0].copy()
-        if cand.empty:
-            results.append({
-                "ת\"ז הסטודנט": s["stu_id"],
-                "שם פרטי": s["stu_first"],
-                "שם משפחה": s["stu_last"],
-                "שם מקום ההתמחות": "לא שובץ",
-                "עיר המוסד": "",
-                "תחום ההתמחות במוסד": "",
-                "שם המדריך": "",
-                "אחוז התאמה": 0,
-                "_expl": {"התאמת תחום":0,"מרחק/גיאוגרפיה":0,"בקשות מיוחדות":0,"עדיפויות הסטודנט/ית":0}
-            })
-            continue
-
-        # חישוב ציון + פירוק רכיבים
-        cand[["score","_parts"]] = cand.apply(
-            lambda r: pd.Series(compute_score_with_explain(s, r, W)),
-            axis=1
-        )
-
-        # סינון לפי מדריך: מותר עד 2 סטודנטים לכל מדריך (ניתן לשנות לפי צורך)
-        def allowed_supervisor(r):
-            sup = r.get("שם המדריך", "")
-            return supervisor_count.get(sup, 0) < 2
-
-        cand = cand[cand.apply(allowed_supervisor, axis=1)]
-
-        if cand.empty:
-            # אם אין מדריכים פנויים – נבחר את האתר עם הציון הגבוה ביותר מבין הזמינים לפני הסינון
-            all_sites = sites_df[sites_df["capacity_left"] > 0].copy()
-            if all_sites.empty:
-                results.append({
-                    "ת\"ז הסטודנט": s["stu_id"],
-                    "שם פרטי": s["stu_first"],
-                    "שם משפחה": s["stu_last"],
-                    "שם מקום ההתמחות": "לא שובץ",
-                    "עיר המוסד": "",
-                    "תחום ההתמחות במוסד": "",
-                    "שם המדריך": "",
-                    "אחוז התאמה": 0,
-                    "_expl": {"התאמת תחום":0,"מרחק/גיאוגרפיה":0,"בקשות מיוחדות":0,"עדיפויות הסטודנט/ית":0}
-                })
-                continue
-
-            all_sites[["score","_parts"]] = all_sites.apply(
-                lambda r: pd.Series(compute_score_with_explain(s, r, W)),
-                axis=1
-            )
-            cand = all_sites.sort_values("score", ascending=False).head(1)
-        else:
-            cand = cand.sort_values("score", ascending=False)
-
-        chosen = cand.iloc[0]
-        idx = chosen.name
-        sites_df.at[idx, "capacity_left"] -= 1
-
-        sup_name = chosen.get("שם המדריך", "")
-        supervisor_count[sup_name] = supervisor_count.get(sup_name, 0) + 1
-
-        results.append({
-            "ת\"ז הסטודנט": s["stu_id"],
-            "שם פרטי": s["stu_first"],
-            "שם משפחה": s["stu_last"],
-            "שם מקום ההתמחות": chosen["site_name"],
-            "עיר המוסד": chosen.get("site_city", ""),
-            "תחום ההתמחות במוסד": chosen["site_field"],
-            "שם המדריך": sup_name,
-            # >>> דרישת המרצים: אחוז התאמה מספר שלם
-            "אחוז התאמה": int(chosen["score"]),
-            "_expl": chosen["_parts"]
-        })
+# ====== מאגר הריצות ======
+# כל ריצה שהסתיימה נשמרת בדיסק (PLACEMENT_RUNS_DIR) ומזהה הריצה נשמר בכתובת הדף,
+# כך שריענון הדפדפן או הפעלה מחדש של השרת טוענים אותה שוב בלי לשבץ מחדש.
+runs = RunStore()
 
-    return pd.DataFrame(results)
-
-# ---- יצירת XLSX ----
-def df_to_xlsx_bytes(df: pd.DataFrame, sheet_name: str = "שיבוץ") -> bytes:
-    xlsx_io = BytesIO()
-    import xlsxwriter
-    with pd.ExcelWriter(xlsx_io, engine="xlsxwriter") as writer:
-        cols = list(df.columns)
-        has_match_col = "אחוז התאמה" in cols
-        if has_match_col:
-            cols = [c for c in cols if c != "אחוז התאמה"] + ["אחוז התאמה"]
-
-        df[cols].to_excel(writer, index=False, sheet_name=sheet_name)
-
-        if has_match_col:
-            workbook  = writer.book
-            worksheet = writer.sheets[sheet_name]
-            red_fmt = workbook.add_format({"font_color": "red"})
-            col_idx = len(cols) - 1
-            worksheet.set_column(col_idx, col_idx, 12, red_fmt)
-    xlsx_io.seek(0)
-    return xlsx_io.getvalue()
+def save_run(result_df: pd.DataFrame, sites_after: pd.DataFrame, students_df: pd.DataFrame,
+             sites_df: pd.DataFrame, mode: str, label: str, run_id: str = "") -> str:
+    run_id = run_id or new_run_id()
+    try:
+        runs.save(students_df, sites_df, result_df, sites_after, Weights(), mode, label, run_id=run_id)
+        st.query_params["run"] = run_id
+    except Exception as e:
+        st.session_state["run_store_notice"] = ("warning", f"הריצה לא נשמרה בדיסק: {e}")
+    return run_id
+
+def load_run(run_id: str) -> None:
+    snap = runs.load(run_id)
+    frames.put("df_students", snap.students_df)
+    frames.put("df_sites", snap.sites_df)
+    frames.put("result_df", snap.result_df)
+    frames.put("sites_after", snap.sites_after)
+    st.session_state["run_id"] = run_id
+    st.session_state.pop("rematch_moves", None)
+    st.query_params["run"] = run_id
+
+if st.session_state.get("result_df") is None and "run" in st.query_params:
+    try:
+        load_run(st.query_params["run"])
+    except (KeyError, ValueError, OSError):
+        del st.query_params["run"]  # הריצה נמחקה או שהמזהה שגוי
 
 # =========================
 # שיבוץ והצגת תוצאות
@@ -474,6 +368,23 @@ if "result_df" not in st.session_state:
 
 st.markdown("## ⚙️ ביצוע השיבוץ")
 
+MODE_LABELS = {
+    "חמדני – לפי סדר הקובץ": "greedy",
+    "אופטימלי – מקסימום התאמה כוללת": "optimal",
+    "יציב – הצעות סטודנטים (Deferred Acceptance)": "stable",
+}
+match_mode = st.radio("שיטת שיבוץ:", list(MODE_LABELS.keys()), index=0, horizontal=True,
+                      help="חמדני: כל סטודנט בתורו מקבל את האתר הטוב ביותר שנותר. "
+                           "אופטימלי: מקסימום סכום אחוזי ההתאמה לכל המחזור, ללא תלות בסדר השורות בקובץ. "
+                           "יציב: אין סטודנט/ית ואתר שמעדיפים זה את זה על פני השיבוץ שקיבלו.")
+match_kwargs = {}
+if MODE_LABELS[match_mode] == "stable":
+    rank_labels = st.multiselect("דירוג הסטודנטים מצד האתרים (לפי סדר החשיבות):",
+                                 list(SITE_RANK_KEYS.values()),
+                                 default=[SITE_RANK_KEYS[k] for k in DEFAULT_SITE_RANK])
+    label_to_key = {v: k for k, v in SITE_RANK_KEYS.items()}
+    match_kwargs["site_rank"] = tuple(label_to_key[l] for l in rank_labels)
+
 # כפתור ממורכז ויפה
 c1, c2, c3 = st.columns([1, 2, 1], gap="large")
 with c2:
@@ -481,52 +392,108 @@ with c2:
     run_match = st.button("🚀 בצע שיבוץ", use_container_width=True)
     st.markdown('</div>', unsafe_allow_html=True)
 
+# ====== השיבוץ רץ ברקע ======
+# הכפתור רק שולח עבודה; פאנל ההתקדמות מתרענן לבד (fragment עם run_every) עד שהעבודה מסתיימת,
+# ואז התוצאה נשמרת ב-session_state["result_df"] והאפליקציה כולה רצה מחדש כדי להציג אותה.
+JOB_POLL_SECONDS = 0.5
+
 if run_match:
+    job = st.session_state.get("match_job")
+    if job is not None and job.running:
+        st.warning("שיבוץ כבר רץ – אפשר לבטל אותו ולהריץ מחדש.")
+    else:
+        try:
+            diag.run_id = new_run_id()
+            students, sites = frames.get("df_students"), frames.get("df_sites")
+            # עיר/תחום עם אותן קטגוריות בשני הקבצים – השיבוץ משווה קודים
+            students, sites = share_categories(students, sites)
+            job = submit_match(MODE_LABELS[match_mode], students, sites, Weights(), **match_kwargs)
+            job.run_id = diag.run_id
+            st.session_state["match_job"] = job
+        except Exception as e:
+            st.exception(e)
+
+# ====== דוחות הריצה – נבנים פעם אחת לכל ריצת שיבוץ ======
+# תוצאות, סיכום, קיבולות וטבלת המורים בשלב וקטורי אחד. cache_resource ולא cache_data:
+# כל rerun מקבל את אותם אובייקטים (בלי העתקה) ורק חותך אותם. הטבלאות נשמרות בטיפוסים
+# קומפקטיים, כמו טבלאות הסשן – המטמון הזה לא נשפך לדיסק
+@st.cache_resource(max_entries=CACHE_MAX_ENTRIES, show_spinner="בונה דוחות…")
+def run_reports(run_id: str, _result_df: pd.DataFrame, _sites_df: pd.DataFrame) -> RunReports:
+    reports = build_reports(_result_df, _sites_df)
+    return replace(reports, results=compact_frame(reports.results), summary=compact_frame(reports.summary),
+                   teachers=compact_frame(reports.teachers))
+
+def finish_match(job) -> None:
     try:
-        students = resolve_students(st.session_state["df_students_raw"])
-        sites    = resolve_sites(st.session_state["df_sites_raw"])
-        result_df = greedy_match(students, sites, Weights())
-        st.session_state["result_df"] = result_df
-        # נשמור גם עותק של ה"sites" כדי להשתמש לקיבולות
-        st.session_state["sites_after"] = sites
-        st.success("השיבוץ הושלם ✓")
+        result_df = job.result()
+    except MatchCancelled:
+        st.session_state["match_notice"] = ("warning", "השיבוץ בוטל.")
     except Exception as e:
-        st.exception(e)
-
-if isinstance(st.session_state["result_df"], pd.DataFrame) and not st.session_state["result_df"].empty:
-    st.markdown("## 📊 תוצאות השיבוץ")
-
-    base_df = st.session_state["result_df"].copy()
-
-    # ---- בניית טבלת התוצאות המרכזית לפי סדר/תוויות המרצים ----
-    df_show = pd.DataFrame({
-        "אחוז התאמה": base_df["אחוז התאמה"].astype(int),
-        "שם הסטודנט/ית": (base_df["שם פרטי"].astype(str) + " " + base_df["שם משפחה"].astype(str)).str.strip(),
-        "תעודת זהות": base_df["ת\"ז הסטודנט"],
-        "תחום התמחות": base_df["תחום ההתמחות במוסד"],
-        "עיר המוסד": base_df["עיר המוסד"],
-        "שם מקום ההתמחות": base_df["שם מקום ההתמחות"],
-        "שם המדריך/ה": base_df["שם המדריך"],
-    })
-
-    # מיון מהגבוה לנמוך (ללא סטטוס/סף)
-    df_show = df_show.sort_values("אחוז התאמה", ascending=False)
-
-    st.markdown("### טבלת תוצאות מרכזית")
-    st.dataframe(df_show, use_container_width=True)
-
-    # הורדת קובץ תוצאות (בדיוק העמודות שנראות)
-    xlsx_results = df_to_xlsx_bytes(df_show, sheet_name="תוצאות")
-    st.download_button("⬇️ הורדת XLSX – תוצאות השיבוץ", data=xlsx_results,
-        file_name="student_site_matching.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-
-    # --- הסבר ציון (שבירת התאמה) ---
+        st.session_state["match_notice"] = ("exception", e)
+    else:
+        frames.put("result_df", result_df)
+        # נשמור גם עותק של ה"sites" כדי להשתמש לקיבולות
+        frames.put("sites_after", job.sites_df)
+        # מזהה ריצה – מפתח המטמון של כל הטבלאות הנגזרות, וגם שם הריצה במאגר
+        st.session_state["run_id"] = save_run(result_df, job.sites_df, frames.get("df_students"),
+                                              frames.get("df_sites"), job.mode, "שיבוץ מלא", job.run_id)
+        st.session_state.pop("rematch_moves", None)
+        # הדוחות נבנים כאן, פעם אחת; ה-reruns הבאים רק חותכים אותם
+        run_reports(st.session_state["run_id"], result_df, job.sites_df)
+        st.session_state["match_notice"] = ("success", f"השיבוץ הושלם ✓ ({job.elapsed:.1f} שניות)")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_panel(key: str, unit: str, finish) -> None:
+    # key: מפתח העבודה ב-session_state; finish: שמירת התוצאה כשהעבודה מסתיימת
+    job = st.session_state.get(key)
+    if job is None:
+        return
+    if job.running:
+        st.progress(min(job.done / max(job.total, 1), 1.0),
+                    text=f"רץ… {job.done:,} מתוך {job.total:,} {unit} · {job.rate:,.1f} {unit}/שנייה")
+        if st.button("✋ ביטול", key=f"cancel_{key}", disabled=job.cancelled):
+            job.cancel()
+        return
+    del st.session_state[key]
+    finish(job)
+    st.rerun()
+
+def show_notice(key: str) -> None:
+    notice = st.session_state.pop(key, None)
+    if notice is not None:
+        kind, payload = notice
+        getattr(st, kind)(payload)
+
+if st.session_state.get("match_job") is not None:
+    job_panel("match_job", "סטודנטים", finish_match)
+show_notice("match_notice")
+
+# קבצי ההורדה נבנים רק בלחיצה על כפתור ההורדה (data כ-callable) ונשמרים במטמון לכל ריצה
+@st.cache_data(max_entries=2 * CACHE_MAX_ENTRIES, show_spinner=False)
+def run_xlsx(run_id: str, sheet_name: str, _df: pd.DataFrame) -> bytes:
+    return df_to_xlsx_bytes(_df, sheet_name=sheet_name)
+
+@st.cache_data(max_entries=2 * CACHE_MAX_ENTRIES, show_spinner="מחשב חלופות…")
+def run_alternatives(run_id: str, k: int, _load_students, _sites_df: pd.DataFrame,
+                     _result_df: pd.DataFrame) -> pd.DataFrame:
+    # _load_students: frames.lazy – טבלת הסטודנטים (אולי בדיסק) נקראת רק כשאין פגיעה במטמון
+    return alternatives_table(_load_students(), _sites_df, _result_df, Weights(), k)
+
+@st.cache_data(max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def run_workbook(run_id: str, _result_df: pd.DataFrame, _sites_df: pd.DataFrame,
+                 _alternatives: pd.DataFrame = None, _reports: RunReports = None) -> bytes:
+    return workbook_bytes(report_sheets(_result_df, _sites_df, _alternatives, _reports))
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# ====== פאנלים שמתרעננים בנפרד (fragments) – שינוי בווידג'ט מריץ רק את הפאנל שלו ======
+@st.fragment
+def explain_panel(run_id: str, base_df: pd.DataFrame) -> None:
     st.markdown("### 🧩 הסבר ציון – שבירת התאמה")
     idx_max = len(base_df) - 1
     ex_idx = st.number_input("בחר/י שורה להסבר (0..):", min_value=0, max_value=idx_max, value=0, step=1)
     try:
-        expl = base_df.iloc[int(ex_idx)]["_expl"]
+        expl = score_breakdown(base_df, ex_idx)
         ex_df = pd.DataFrame({
             "מרכיב": ["מרחק/גיאוגרפיה","התאמת תחום","עדיפויות הסטודנט/ית","בקשות מיוחדות"],
             "תרומה": [expl.get("מרחק/גיאוגרפיה",0), expl.get("התאמת תחום",0), expl.get("עדיפויות הסטודנט/ית",0), expl.get("בקשות מיוחדות",0)]
@@ -536,77 +503,241 @@ if isinstance(st.session_state["result_df"], pd.DataFrame) and not st.session_st
     except Exception:
         st.info("אין נתוני הסבר לציון עבור השורה שנבחרה.")
 
+@st.fragment
+def teacher_panel(reports: RunReports) -> None:
+    st.markdown("### 👩‍🏫 דוח פר־מורה שיטות")
+    teachers_list = [ALL_TEACHERS] + reports.teacher_names
+    pick_teacher = st.selectbox("סינון לפי מורה:", teachers_list, index=0)
+    st.dataframe(reports.teacher(pick_teacher), use_container_width=True)
+
+@st.fragment
+def alternatives_panel(run_id: str, base_df: pd.DataFrame, load_students, sites_df: pd.DataFrame) -> None:
+    st.markdown("### 🥈 חלופות – האתרים הבאים בתור לכל סטודנט/ית")
+    k = st.number_input("כמה חלופות לכל סטודנט/ית:", min_value=1, max_value=10, value=DEFAULT_ALTERNATIVES, step=1)
+    alt_df = run_alternatives(run_id, int(k), load_students, sites_df, base_df)
+    st.dataframe(alt_df, use_container_width=True, hide_index=True)
+    st.download_button("⬇️ הורדת XLSX – חלופות", data=in_context(partial(run_xlsx, f"{run_id}:{k}", "חלופות", alt_df)),
+        file_name="student_site_alternatives.xlsx", mime=XLSX_MIME)
+
+base_df = frames.get("result_df")
+if isinstance(base_df, pd.DataFrame) and not base_df.empty:
+    st.markdown("## 📊 תוצאות השיבוץ")
+
+    sites_after = frames.get("sites_after")
+    run_id = st.session_state.setdefault("run_id", uuid.uuid4().hex)
+    diag.run_id = run_id
+    # חלופות דורשות את קובץ הסטודנטים של הריצה (אותן שורות באותו סדר)
+    # טבלת הסטודנטים נקראת רק כשצריך אותה (חלופות שאינן במטמון, חוברת, עדכון שיבוץ)
+    load_students = frames.lazy("df_students")
+    has_alternatives = isinstance(sites_after, pd.DataFrame) and frames.rows("df_students") == len(base_df)
+
+    # ---- כל הדוחות של הריצה (מהמטמון; נבנים רק בפעם הראשונה) ----
+    reports = run_reports(run_id, base_df, sites_after)
+    if st.session_state.get("_reports_noted") != run_id:
+        # הדוחות מוחזקים ב-cache_resource מחוץ לסשן – נספרים בפאנל הזיכרון, פעם אחת לכל ריצה
+        frames.note_shared("דוחות הריצה (מטמון)", reports.results, reports.summary, reports.capacity, reports.teachers)
+        st.session_state["_reports_noted"] = run_id
+    df_show = reports.results
+
+    st.markdown("### טבלת תוצאות מרכזית")
+    st.dataframe(df_show, use_container_width=True)
+
+    # הורדת קובץ תוצאות (בדיוק העמודות שנראות)
+    st.download_button("⬇️ הורדת XLSX – תוצאות השיבוץ", data=in_context(partial(run_xlsx, run_id, "תוצאות", df_show)),
+        file_name="student_site_matching.xlsx", mime=XLSX_MIME)
+    st.download_button("⬇️ הורדת XLSX – חוברת מלאה (תוצאות, סיכום, קיבולות, חלופות, גיליון לכל מורה)",
+        data=in_context(lambda: run_workbook(run_id, base_df, sites_after,
+                                             run_alternatives(run_id, DEFAULT_ALTERNATIVES, load_students, sites_after, base_df)
+                                             if has_alternatives else None, reports)),
+        file_name="student_site_reports.xlsx", mime=XLSX_MIME)
+
+    # --- הסבר ציון (שבירת התאמה) ---
+    explain_panel(run_id, base_df)
+
     # --- דוח סיכום לפי מקום הכשרה (כמות/שמות) ---
     st.markdown("### 📝 טבלת סיכום לפי מקום הכשרה")
-    summary_df = (
-        base_df
-        .groupby(["שם מקום ההתמחות","תחום ההתמחות במוסד","שם המדריך"])
-        .agg({
-            "ת\"ז הסטודנט":"count",
-            "שם פרטי": list,
-            "שם משפחה": list
-        }).reset_index()
-    )
-    summary_df.rename(columns={"ת\"ז הסטודנט":"כמה סטודנטים"}, inplace=True)
-    summary_df["המלצת שיבוץ"] = summary_df.apply(
-        lambda row: " + ".join([f"{f} {l}" for f, l in zip(row["שם פרטי"], row["שם משפחה"])]),
-        axis=1
-    )
-    summary_df = summary_df[[
-        "שם miejsce ההתמחות".replace("miejsce","מקום"),
-        "תחום ההתמחות במוסד",
-        "שם המדריך",
-        "כמה סטודנטים",
-        "המלצת שיבוץ"
-    ]].rename(columns={"שם miejsce ההתמחות".replace("miejsce","מקום"): "שם מקום ההתמחות"})
+    summary_df = reports.summary
 
     st.dataframe(summary_df, use_container_width=True)
-    xlsx_summary = df_to_xlsx_bytes(summary_df, sheet_name="סיכום")
-    st.download_button("⬇️ הורדת XLSX – טבלת סיכום", data=xlsx_summary,
-        file_name="student_site_summary.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+    st.download_button("⬇️ הורדת XLSX – טבלת סיכום", data=in_context(partial(run_xlsx, run_id, "סיכום", summary_df)),
+        file_name="student_site_summary.xlsx", mime=XLSX_MIME)
 
     # --- דוח קיבולות: קיבולת/שובצו/יתרה ---
     st.markdown("### 🏷️ דוח קיבולות לפי מקום הכשרה")
-    sites_after = st.session_state.get("sites_after", None)
-    if isinstance(sites_after, pd.DataFrame) and not sites_after.empty:
-        caps = sites_after.groupby("site_name")["site_capacity"].sum().to_dict()
-        assigned = base_df.groupby("שם מקום ההתמחות")["ת\"ז הסטודנט"].count().to_dict()
-        cap_rows = []
-        for site, capacity in caps.items():
-            used = int(assigned.get(site, 0))
-            cap_rows.append({
-                "שם מקום ההתמחות": site,
-                "קיבולת": int(capacity),
-                "שובצו בפועל": used,
-                "יתרה/חוסר": int(capacity - used)
-            })
-        cap_df = pd.DataFrame(cap_rows).sort_values("שם מקום ההתמחות")
-        st.dataframe(cap_df, use_container_width=True)
+    if reports.capacity is not None:
+        st.dataframe(reports.capacity, use_container_width=True)
 
         # הדגשה טקסטואלית של פנוי/חריגה (נשאר — זה לא "בדיקה ידנית")
-        under = cap_df[cap_df["יתרה/חוסר"] > 0]
-        over  = cap_df[cap_df["יתרה/חוסר"] < 0]
-        if not under.empty:
-            st.info("מוסדות עם מקומות פנויים:\n- " + "\n- ".join(under["שם מקום ההתמחות"].tolist()))
-        if not over.empty:
-            st.error("מוסדות עם חריגה (עודף שיבוץ):\n- " + "\n- ".join(over["שם מקום ההתמחות"].tolist()))
+        under, over = reports.surplus(), reports.overflow()
+        if under:
+            st.info("מוסדות עם מקומות פנויים:\n- " + "\n- ".join(under))
+        if over:
+            st.error("מוסדות עם חריגה (עודף שיבוץ):\n- " + "\n- ".join(over))
     else:
         st.info("לא נמצאו נתוני קיבולת לשיבוץ זה.")
 
     # --- דוח ריכוזי פר־מורה ---
-    st.markdown("### 👩‍🏫 דוח פר־מורה שיטות")
-    teachers_list = ["(כולם)"] + sorted([x for x in base_df["שם המדריך"].unique() if str(x).strip() != ""])
-    pick_teacher = st.selectbox("סינון לפי מורה:", teachers_list, index=0)
-    df_for_teacher = base_df.copy()
-    if pick_teacher != "(כולם)":
-        df_for_teacher = df_for_teacher[df_for_teacher["שם המדריך"] == pick_teacher]
-    st.dataframe(
-        pd.DataFrame({
-            "שם הסטודנט/ית": (df_for_teacher["שם פרטי"].astype(str) + " " + df_for_teacher["שם משפחה"].astype(str)).str.strip(),
-            "תעודת זהות": df_for_teacher["ת\"ז הסטודנט"],
-            "שם מקום ההתמחות": df_for_teacher["שם מקום ההתמחות"],
-            "אחוז התאמה": df_for_teacher["אחוז התאמה"].astype(int)
-        }).sort_values("אחוז התאמה", ascending=False),
-        use_container_width=True
-    )
+    teacher_panel(reports)
+
+    # --- חלופות לכל סטודנט/ית ---
+    if has_alternatives:
+        alternatives_panel(run_id, base_df, load_students, sites_after)
+
+    # --- עדכון שיבוץ קיים: רק המושפעים משובצים מחדש, כל השאר נשארים במקומם ---
+    with st.expander("🔁 עדכון שיבוץ קיים – רישום מאוחר, ביטול, שינוי קיבולת/מדריך"):
+        show_notice("rematch_notice")
+        moves = st.session_state.get("rematch_moves")
+        if isinstance(moves, pd.DataFrame):
+            st.dataframe(moves, use_container_width=True)
+            st.download_button("⬇️ הורדת XLSX – שינויים בשיבוץ", data=in_context(partial(run_xlsx, run_id, "שינויים", moves)),
+                file_name="student_site_changes.xlsx", mime=XLSX_MIME)
+        if isinstance(sites_after, pd.DataFrame) and not sites_after.empty:
+            with st.form("rematch_form"):
+                late_file = st.file_uploader("סטודנטים חדשים (אופציונלי)", type=["csv","xlsx","xls"], key="late_students_file")
+                removed_text = st.text_area("ת\"ז של סטודנטים שירדו (מופרדים בפסיק או בשורות)", key="removed_ids")
+                site_cols = {"site_name": "שם מקום ההתמחות", "site_city": "עיר", "site_capacity": "קיבולת", "שם המדריך": "שם המדריך"}
+                site_view = sites_after[list(site_cols)].rename(columns=site_cols).astype({"קיבולת": int, "שם המדריך": str})
+                edited = st.data_editor(site_view, use_container_width=True, hide_index=True,
+                                        disabled=["שם מקום ההתמחות", "עיר"], key="site_edits")
+                apply_diff = st.form_submit_button("🔁 עדכן שיבוץ")
+            if apply_diff:
+                try:
+                    cap_pos = np.flatnonzero(edited["קיבולת"].to_numpy() != site_view["קיבולת"].to_numpy())
+                    sup_pos = np.flatnonzero(edited["שם המדריך"].to_numpy() != site_view["שם המדריך"].to_numpy())
+                    diff = CohortDiff(
+                        added=resolve_students(read_any(late_file, STUDENT_FIELDS)) if late_file is not None else None,
+                        removed_ids=[x for x in re.split(r"[\s,;]+", removed_text) if x],
+                        capacity={int(j): int(edited["קיבולת"].iat[j]) for j in cap_pos},
+                        supervisors={int(j): str(edited["שם המדריך"].iat[j]) for j in sup_pos})
+                    if diff.empty:
+                        st.info("לא הוזנו שינויים.")
+                    else:
+                        diag.run_id = new_run_id()
+                        res = rematch(load_students(), sites_after, base_df, diff, Weights())
+                        frames.put("result_df", res.result_df)
+                        frames.put("sites_after", res.sites_df)
+                        frames.put("df_students", res.students_df)
+                        frames.put("df_sites", res.sites_df.assign(capacity_left=res.sites_df["site_capacity"]))
+                        st.session_state["run_id"] = save_run(res.result_df, res.sites_df, res.students_df,
+                                                              frames.get("df_sites"), "greedy", "עדכון שיבוץ", diag.run_id)
+                        st.session_state["rematch_moves"] = res.moves
+                        note = f"השיבוץ עודכן ✓ – {res.affected:,} סטודנטים נבדקו לשיבוץ מחדש, {len(res.moves):,} שינויים"
+                        if res.unknown_ids:
+                            note += " · ת\"ז שלא נמצאו: " + ", ".join(res.unknown_ids)
+                        st.session_state["rematch_notice"] = ("success", note)
+                        st.rerun()
+                except Exception as e:
+                    st.exception(e)
+
+# ====== ריצות שמורות: טעינה והשוואה ======
+@st.fragment
+def runs_panel() -> None:
+    show_notice("run_store_notice")
+    runs_df = runs.list()
+    if runs_df.empty:
+        st.info("עדיין אין ריצות שמורות.")
+        return
+    st.caption(f"תיקיית הריצות: {runs.root}")
+    st.dataframe(runs_df, use_container_width=True, hide_index=True)
+    ids = runs_df["מזהה ריצה"].tolist()
+    pick = st.selectbox("ריצה לטעינה:", ids, key="run_pick")
+    if st.button("📂 טען ריצה", key="load_run"):
+        try:
+            load_run(pick)
+        except Exception as e:
+            st.exception(e)
+        else:
+            st.rerun()
+
+    st.markdown("#### 🔍 השוואת שתי ריצות")
+    c1, c2 = st.columns(2)
+    run_a = c1.selectbox("ריצה א (בסיס):", ids, index=min(1, len(ids) - 1), key="diff_a")
+    run_b = c2.selectbox("ריצה ב:", ids, index=0, key="diff_b")
+    if st.button("השווה", key="diff_runs"):
+        try:
+            st.session_state["run_diff"] = (run_a, run_b, diff_runs(runs.load(run_a), runs.load(run_b)))
+        except Exception as e:
+            st.exception(e)
+    shown = st.session_state.get("run_diff")
+    if shown is not None:
+        a, b, diff = shown
+        st.caption(f"א: {a} · ב: {b}")
+        st.dataframe(pd.DataFrame([diff.summary]), use_container_width=True, hide_index=True)
+        st.markdown("**סטודנטים שהשיבוץ או הציון שלהם השתנו**")
+        st.dataframe(diff.moves, use_container_width=True, hide_index=True)
+        st.markdown("**שינויי קיבולת ומשובצים לפי אתר**")
+        st.dataframe(diff.capacity, use_container_width=True, hide_index=True)
+        st.download_button("⬇️ הורדת XLSX – השוואת ריצות",
+            data=in_context(partial(workbook_bytes, {"סטודנטים": diff.moves, "קיבולות": diff.capacity})),
+            file_name=f"runs_diff_{a}_{b}.xlsx", mime=XLSX_MIME)
+
+with st.expander("💾 ריצות שמורות – טעינה והשוואה"):
+    runs_panel()
+
+# ====== ניתוח רגישות למשקלות ======
+# השיבוץ (בשיטה שנבחרה) רץ מחדש לכל צירוף משקלות ברשת, בתהליכים מקבילים ברקע
+SWEEP_STEPS = {f"{step} ({len(weight_grid(step))} צירופים)": step for step in (0.25, 0.2, 0.1, 0.05)}
+
+def finish_sweep(job) -> None:
+    try:
+        st.session_state["sweep_df"] = job.result()
+    except MatchCancelled:
+        st.session_state["sweep_notice"] = ("warning", "ניתוח הרגישות בוטל.")
+    except Exception as e:
+        st.session_state["sweep_notice"] = ("exception", e)
+    else:
+        st.session_state["sweep_notice"] = ("success", f"ניתוח הרגישות הושלם ✓ ({job.elapsed:.1f} שניות)")
+
+with st.expander("🔬 ניתוח רגישות למשקלות"):
+    st.caption("כל צירוף של משקלות תחום/עיר/בקשות שסכומם 1. \"עברו אתר\" נספר מול משקלות ברירת המחדל "
+               f"({Weights().w_field}/{Weights().w_city}/{Weights().w_special}).")
+    step_label = st.selectbox("צעד ברשת המשקלות:", list(SWEEP_STEPS), index=2)
+    if st.button("▶️ הרץ ניתוח רגישות", key="run_sweep"):
+        job = st.session_state.get("sweep_job")
+        if job is not None and job.running:
+            st.warning("ניתוח רגישות כבר רץ.")
+        else:
+            try:
+                students, sites = share_categories(frames.get("df_students"), frames.get("df_sites"))
+                st.session_state["sweep_job"] = submit_sweep(students, sites, weight_grid(SWEEP_STEPS[step_label]),
+                                                             mode=MODE_LABELS[match_mode], **match_kwargs)
+            except Exception as e:
+                st.exception(e)
+    if st.session_state.get("sweep_job") is not None:
+        job_panel("sweep_job", "צירופים", finish_sweep)
+    show_notice("sweep_notice")
+    sweep_df = st.session_state.get("sweep_df")
+    if isinstance(sweep_df, pd.DataFrame):
+        st.dataframe(sweep_df, use_container_width=True, hide_index=True)
+        st.download_button("⬇️ הורדת XLSX – ניתוח רגישות", data=in_context(partial(df_to_xlsx_bytes, sweep_df, "ניתוח רגישות")),
+            file_name="weight_sensitivity.xlsx", mime=XLSX_MIME)
+
+# ====== אבחון ביצועים – לכל שלב: זמן, שורות ושיא הקצאות ======
+def diagnostics_jsonl(records: list) -> str:
+    return "\n".join(json.dumps(asdict(r), ensure_ascii=False) for r in records)
+
+with st.expander("⏱️ אבחון ביצועים"):
+    current_run = st.session_state.get("run_id") or ""
+    show_all = st.checkbox("כל הריצות בסשן", key="diag_all")
+    st.checkbox("מדידת שיא הקצאות (tracemalloc)", value=TRACE_MEMORY, key="diag_trace_memory",
+                help="מאט קריאה, זיהוי ושיבוץ פי כמה, גם לסשנים אחרים בשרת; נכנס לתוקף מהפעולה הבאה")
+    diag_df = diag.frame()
+    if not show_all:
+        diag_df = diag_df[diag_df["ריצה"].isin(["", current_run])]
+    if diag_df.empty:
+        st.info("עדיין לא נמדדו שלבים בסשן הזה.")
+    else:
+        top = diag_df[~diag_df["שלב"].str.contains("/", regex=False)]
+        st.caption(f"{len(top)} שלבים ראשיים · {top['שניות'].sum():.2f} שניות בסה\"כ · "
+                   "שלבים מקוננים מסומנים ב-/ (למשל greedy_match/score); שלב שנלקח מהמטמון לא נמדד שוב")
+        st.dataframe(diag_df.iloc[::-1], use_container_width=True, hide_index=True)
+        st.download_button("⬇️ הורדת JSON – רשומות האבחון", data=partial(diagnostics_jsonl, list(diag.records)),
+            file_name="placement_diagnostics.jsonl", mime="application/json")
+
+# ====== זיכרון הסשן ======
+with st.expander("🧠 זיכרון הסשן"):
+    usage = frames.usage()
+    st.caption(f"טבלאות הסשן בזיכרון: {frames.memory_bytes() / 2**20:.1f} MB מתוך תקציב של "
+               f"{frames.budget_bytes / 2**20:.0f} MB · במטמונים המשותפים: {frames.shared_bytes() / 2**20:.1f} MB "
+               f"(לא נשפכים לדיסק) · בדיסק: {usage['דיסק (MB)'].sum():.1f} MB")
+    st.dataframe(usage, use_container_width=True, hide_index=True)
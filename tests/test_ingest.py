@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+# קריאת CSV: read_any ו-read_csv_chunks מחזירים את אותם ערכים (סדר הקטגוריות יכול להיות שונה),
+# ות"ז נשארת מחרוזת כמו בקובץ
+import pandas as pd
+
+from placement import STUDENT_FIELDS, normalize_series, normalize_text, read_any, read_csv_chunks
+from placement.ingest import _concat_chunks
+from placement.synth import make_students
+
+def test_csv_ids_keep_leading_zeros(tmp_path):
+    path = tmp_path / "students.csv"
+    pd.DataFrame({"מספר תעודת זהות": ["021834942", "000000018", "300000001"],
+                  "שם פרטי": ["דנה", "יוסי", ""], "שם משפחה": ["כהן", "לוי", "מזרחי"],
+                  "עיר": ["חיפה", "", "אשדוד"]}).to_csv(path, index=False, encoding="utf-8-sig")
+    ids = ["021834942", "000000018", "300000001"]
+    whole = read_any(str(path), STUDENT_FIELDS)
+    chunked = _concat_chunks(read_csv_chunks(str(path), STUDENT_FIELDS, chunksize=2))
+    assert whole["מספר תעודת זהות"].tolist() == ids
+    assert chunked["מספר תעודת זהות"].tolist() == ids
+    pd.testing.assert_frame_equal(whole, chunked, check_categorical=False)
+
+def test_read_any_matches_chunked_path(tmp_path):
+    path = tmp_path / "students.csv"
+    make_students(2000, seed=3).to_csv(path, index=False, encoding="utf-8-sig")
+    whole = read_any(str(path), STUDENT_FIELDS)
+    chunked = read_any(str(path), STUDENT_FIELDS, chunksize=500)
+    pd.testing.assert_frame_equal(whole, chunked, check_categorical=False)
+
+def test_normalize_series_matches_normalize_text():
+    # רווחי Unicode (רווח צר, רווח קשיח צר, רווח אידאוגרפי) – אותה תוצאה בתא בודד ובעמודה
+    vals = ["תל\u2009אביב", " באר\u202f\u202fשבע\u3000", "רמת\u00a0 גן", "דוא\u05f4ל", None]
+    assert normalize_series(pd.Series(vals)).tolist() == [normalize_text(v) for v in vals]
+    assert normalize_text("תל\u2009אביב") == "תל אביב"
@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+# תקציב זמן התגובה של האפליקציה על מחזור קטן – python -m benchmarks.rerun_latency בתהליך נפרד,
+# כי placement קורא את PLACEMENT_RUNS_DIR/PLACEMENT_SPILL_DIR בייבוא (והבדיקות האחרות כבר ייבאו אותו)
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("streamlit.testing.v1")
+
+ROOT = Path(__file__).resolve().parents[1]
+
+def test_reruns_within_budget():
+    proc = subprocess.run([sys.executable, "-m", "benchmarks.rerun_latency", "--size", "2000x200",
+                           "--format", "csv", "--repeats", "1"], cwd=ROOT, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stdout + proc.stderr